@@ -0,0 +1,84 @@
+"""
+Report database size and read/write cost of the letter blob codecs.
+
+Usage: python3 compressionBenchmark.py [letters]
+"""
+import sys
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.postalDatabase import PostalDatabase, codec_from_name
+from modules.HTMLRenderer import HTMLRenderer
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+WORDS = ("querida", "carta", "hoy", "pienso", "en", "ti", "mucho", "siempre", "amor", "luna", "mar", "cielo")
+
+
+def make_letters(count: int) -> list[dict]:
+    postal_info = json.loads((PROJECT_ROOT / "tests/test_data/mock_postal_info.json").read_text(encoding="utf-8"))
+    renderer = HTMLRenderer(PROJECT_ROOT / "templates/letter_template.html")
+    rng = random.Random(42)
+    letters = []
+    for i in range(count):
+        contents = " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 400)))
+        context = {"letter_name": f"letter-{i}", "letter_contents": contents}
+        for role in ("sender", "recipient"):
+            for key, value in postal_info[role].items():
+                context[f"{role}_{key}"] = value
+        letters.append({
+            "letter_id": str(uuid.uuid4()),
+            "letter_name": f"letter-{i}",
+            "creation_datetime": "2025-09-01 10:00:00",
+            "contents": contents,
+            "html_contents": renderer.render(context),
+            "postal_info": postal_info,
+            "received_date": "2025-09-01 10:00:00",
+            "scheduled_delivery_datetime": "2025-09-02 10:00:00",
+            "delivery_datetime": None,
+            "status": "in transit",
+        })
+    return letters
+
+
+def measure(db_path: str, codec_name: str, letters: list[dict]) -> dict:
+    with PostalDatabase(db_path, codec=codec_from_name(codec_name)) as db:
+        start = time.perf_counter()
+        db.insert_letters(letters)
+        write_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in db.iter_all_letters():
+            pass
+        read_seconds = time.perf_counter() - start
+
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.conn.execute("VACUUM")
+        page_count = db.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = db.conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "size_mib": page_count * page_size / 2**20,
+        "write_us_per_letter": write_seconds / len(letters) * 1e6,
+        "read_us_per_letter": read_seconds / len(letters) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    letters = make_letters(count)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec_name in ("none", "zlib", "zdict"):
+            results[codec_name] = measure(os.path.join(tmp, f"{codec_name}.db"), codec_name, letters)
+
+    baseline = results["none"]["size_mib"]
+    print(f"{count} letters")
+    print(f"{'codec':<8}{'size MiB':>10}{'reduction':>11}{'write us/letter':>17}{'read us/letter':>16}")
+    for codec_name, result in results.items():
+        reduction = 1 - result["size_mib"] / baseline
+        print(f"{codec_name:<8}{result['size_mib']:>10.1f}{reduction:>10.0%} "
+              f"{result['write_us_per_letter']:>16.1f}{result['read_us_per_letter']:>16.1f}")
@@ -0,0 +1,91 @@
+"""
+Offline stand-ins for the Gmail and OpenAI clients, with configurable latency
+and error rates, so the delivery pipeline can be measured without a network.
+"""
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.deliveryTransport import DeliveryTransport, build_mime_message
+
+
+class FakeServiceError(Exception):
+    """Shaped like an HTTP API error, so rateLimiter.is_retryable classifies it by status."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Latency:
+    def __init__(self, latency: float, jitter: float, error_rate: float, error_status: int, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, what: str):
+        with self._lock:
+            delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise FakeServiceError(self.error_status, f"fake {what} error {self.error_status}")
+
+
+class FakeEmailSender(DeliveryTransport):
+    """
+    Accepts messages after `latency` seconds (+/- jitter fraction), failing a
+    fraction `error_rate` of them with `error_status`. Messages are built like
+    the real transports do, so MIME encoding cost is included, then dropped.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0):
+        self._latency = _Latency(latency, jitter, error_rate, error_status, seed)
+        self.sent = 0
+        self._count_lock = threading.Lock()
+
+    def send_email(self,
+                   to: str,
+                   subject: str,
+                   body: str,
+                   body_type: str='plain',
+                   attachment_paths: list[str]=None,
+                   bcc: str=None,
+                   attachments: list[tuple[str, bytes, str]]=None):
+        message = build_mime_message(to, subject, body, body_type, attachment_paths, bcc, attachments)
+        message.as_bytes()
+        self._latency.wait("send")
+        with self._count_lock:
+            self.sent += 1
+            return {"id": f"fake-{self.sent}"}
+
+
+class FakeAiTextGenerator:
+    """
+    Answers after `latency` seconds with one subject line per requested
+    subject (the first number in the prompt, else one), failing a fraction
+    `error_rate` of the calls.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 1):
+        self._latency = _Latency(latency, jitter, error_rate, error_status, seed)
+        self._counter = 0
+        self._count_lock = threading.Lock()
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        self._latency.wait("AI")
+        match = re.search(r"\b(\d+)\b", prompt)
+        count = int(match.group(1)) if match else 1
+        with self._count_lock:
+            start = self._counter
+            self._counter += count
+        return "\n".join(f"💌 Una carta te espera #{start + i}" for i in range(count))
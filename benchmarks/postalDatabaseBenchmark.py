@@ -0,0 +1,133 @@
+"""
+Compare PostalDatabase throughput against the previous connection-per-call pattern.
+
+Usage: python3 postalDatabaseBenchmark.py [letters_in_db] [ops_per_benchmark]
+"""
+import sys
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.postalDatabase import PostalDatabase
+
+POSTAL_INFO = {
+    "sender": {"name": "Walter White", "email": "heisenberg@breakingbad.com"},
+    "recipient": {"name": "Jesse Pinkman", "email": "capncook@breakingbad.com"},
+}
+
+
+def make_letter(i: int) -> dict:
+    return {
+        "letter_id": str(uuid.uuid4()),
+        "letter_name": f"letter-{i}",
+        "creation_datetime": "2025-09-01 10:00:00",
+        "contents": "Lorem ipsum dolor sit amet. " * 40,
+        "html_contents": "<p>" + "Lorem ipsum dolor sit amet. " * 40 + "</p>",
+        "postal_info": POSTAL_INFO,
+        "received_date": "2025-09-01 10:00:00",
+        "scheduled_delivery_datetime": "2025-09-02 10:00:00",
+        "delivery_datetime": None,
+        "status": "in transit",
+    }
+
+
+class PerCallConnectionDatabase:
+    """The pre-pooling access pattern: one sqlite3.connect per operation, default pragmas."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def insert_letter(self, letter_data: dict):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO letters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (letter_data["letter_id"], letter_data["letter_name"], letter_data["creation_datetime"],
+                 letter_data["contents"], letter_data["html_contents"], json.dumps(letter_data["postal_info"]),
+                 letter_data["received_date"], letter_data["scheduled_delivery_datetime"],
+                 letter_data["delivery_datetime"], letter_data["status"]),
+            )
+            conn.commit()
+        conn.close()
+
+    def get_letter_by_id(self, letter_id: str):
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT * FROM letters WHERE letter_id = ?", (letter_id,)).fetchone()
+        conn.close()
+        return row
+
+    def update_letter_status(self, letter_id: str, status: str):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE letters SET status = ? WHERE letter_id = ?", (status, letter_id))
+            conn.commit()
+        conn.close()
+
+
+LEGACY_SCHEMA = """
+    CREATE TABLE letters (
+        letter_id TEXT PRIMARY KEY, letter_name TEXT NOT NULL, creation_datetime TEXT NOT NULL,
+        contents TEXT NOT NULL, html_contents TEXT NOT NULL, postal_info TEXT NOT NULL,
+        received_date TEXT NOT NULL, scheduled_delivery_datetime TEXT NOT NULL,
+        delivery_datetime TEXT, status TEXT NOT NULL
+    )
+"""
+
+
+def seed_legacy(db_path: str, count: int) -> list[str]:
+    """Seed a database with the original schema and rollback journal, as the old code left it."""
+    letters = [make_letter(i) for i in range(count)]
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(LEGACY_SCHEMA)
+        conn.executemany(
+            "INSERT INTO letters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(l["letter_id"], l["letter_name"], l["creation_datetime"], l["contents"], l["html_contents"],
+              json.dumps(l["postal_info"]), l["received_date"], l["scheduled_delivery_datetime"],
+              l["delivery_datetime"], l["status"]) for l in letters],
+        )
+    conn.close()
+    return [l["letter_id"] for l in letters]
+
+
+def seed(db_path: str, count: int) -> list[str]:
+    with PostalDatabase(db_path) as db:
+        return db.insert_letters([make_letter(i) for i in range(count)])
+
+
+def ops_per_second(func, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return len(args_list) / (time.perf_counter() - start)
+
+
+def run(db, letter_ids: list[str], ops: int) -> dict:
+    sample = letter_ids[:ops]
+    return {
+        "insert_letter": ops_per_second(db.insert_letter, [(make_letter(i),) for i in range(ops)]),
+        "get_letter_by_id": ops_per_second(db.get_letter_by_id, [(i,) for i in sample]),
+        "update_letter_status": ops_per_second(db.update_letter_status, [(i, "delivered") for i in sample]),
+    }
+
+
+if __name__ == "__main__":
+    letters_in_db = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, "before.db")
+        after_path = os.path.join(tmp, "after.db")
+
+        print(f"Seeding {letters_in_db} letters per database...")
+        before_ids = seed_legacy(before_path, letters_in_db)
+        after_ids = seed(after_path, letters_in_db)
+
+        before = run(PerCallConnectionDatabase(before_path), before_ids, ops)
+        with PostalDatabase(after_path) as db:
+            after = run(db, after_ids, ops)
+
+    print(f"{'operation':<24}{'before ops/s':>14}{'after ops/s':>14}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<24}{before[name]:>14.0f}{after[name]:>14.0f}{after[name] / before[name]:>9.1f}x")
@@ -0,0 +1,121 @@
+"""
+Cold and warm render times of the letter and email body templates.
+
+Cold numbers come from fresh interpreters (first render, including template
+loading and compilation): the old standalone Template(string) compile, the
+shared Environment with an empty bytecode cache, and with a populated one.
+Warm numbers are per render once the compiled template is cached in-process.
+Finally, per-letter cost of render versus render_many for a batch of letters
+sharing one postal_info, at short and long letter bodies.
+
+Usage: python3 renderBenchmark.py [runs] [renders]
+"""
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TEMPLATES = {
+    "letter": PROJECT_ROOT / "templates/letter_template.html",
+    "email_body": PROJECT_ROOT / "templates/email_body_template.html",
+}
+
+COLD_SCRIPT = """
+import sys, json, time
+sys.path.insert(0, {root!r})
+import jinja2
+from benchmarks.renderBenchmark import make_context
+context = make_context()
+start = time.perf_counter()
+if {mode!r} == "standalone":
+    with open({template!r}, "r", encoding="utf-8") as f:
+        jinja2.Template(f.read()).render(**context)
+else:
+    from modules.HTMLRenderer import HTMLRenderer
+    HTMLRenderer({template!r}, bytecode_cache_dir={cache_dir!r}).render(context)
+print(json.dumps(time.perf_counter() - start))
+"""
+
+
+def make_context() -> dict:
+    postal_info = json.loads((PROJECT_ROOT / "tests/test_data/mock_postal_info.json").read_text(encoding="utf-8"))
+    context = {
+        "letter_name": "2025-09-01",
+        "letter_contents": "Querida, hoy pienso en ti. " * 200,
+        "created_date": "2025-09-01 10:00:00",
+        "received_date": "2025-09-01 10:00:00",
+        "scheduled_delivery": "2025-09-03 08:00:00",
+        "sent_date": "2025-09-03 08:00:05",
+    }
+    for role in ("sender", "recipient"):
+        for key, value in postal_info[role].items():
+            context[f"{role}_{key}"] = value
+    context["recipient_name"] = postal_info["recipient"]["name"]
+    return context
+
+
+def cold_render_ms(template: Path, mode: str, cache_dir, runs: int) -> float:
+    script = COLD_SCRIPT.format(root=str(PROJECT_ROOT), mode=mode, template=str(template),
+                                cache_dir=cache_dir and str(cache_dir))
+    times = []
+    for _ in range(runs):
+        if mode == "empty cache":
+            for path in Path(cache_dir).glob("*.cache"):
+                path.unlink()
+        proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        times.append(json.loads(proc.stdout) * 1000)
+    return statistics.median(times)
+
+
+def warm_render_us(template: Path, renders: int) -> float:
+    from modules.HTMLRenderer import HTMLRenderer
+    renderer = HTMLRenderer(template)
+    context = make_context()
+    renderer.render(context)
+    start = time.perf_counter()
+    for _ in range(renders):
+        renderer.render(context)
+    return (time.perf_counter() - start) / renders * 1e6
+
+
+def batch_render_us(renders: int, body_words: int) -> tuple[float, float]:
+    from modules.HTMLRenderer import HTMLRenderer
+    renderer = HTMLRenderer(TEMPLATES["letter"])
+    address = {key: value for key, value in make_context().items() if key.startswith(("sender_", "recipient_"))}
+    contexts = [{"letter_name": f"letter-{i}", "letter_contents": f"{i} " + "querida carta " * body_words}
+                for i in range(renders)]
+    # Batches of 100 letters, like a --submit-all run. Both sides keep a batch
+    # of outputs alive, as submit_letters does until the insert.
+    start = time.perf_counter()
+    for batch_start in range(0, renders, 100):
+        [renderer.render({**address, **context}) for context in contexts[batch_start:batch_start + 100]]
+    single = (time.perf_counter() - start) / renders * 1e6
+    start = time.perf_counter()
+    for batch_start in range(0, renders, 100):
+        renderer.render_many(contexts[batch_start:batch_start + 100], address)
+    batch = (time.perf_counter() - start) / renders * 1e6
+    return single, batch
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    renders = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    print(f"{'template':<12}{'standalone ms':>15}{'empty cache ms':>16}{'bytecode ms':>13}{'warm us':>10}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, template in TEMPLATES.items():
+            standalone = cold_render_ms(template, "standalone", None, runs)
+            empty = cold_render_ms(template, "empty cache", cache_dir, runs)
+            cold_render_ms(template, "bytecode", cache_dir, 1)  # make sure the cache is populated
+            bytecode = cold_render_ms(template, "bytecode", cache_dir, runs)
+            warm = warm_render_us(template, renders)
+            print(f"{name:<12}{standalone:>15.2f}{empty:>16.2f}{bytecode:>13.2f}{warm:>10.1f}")
+
+    print(f"\n{'body words':<12}{'render us':>11}{'render_many us':>16}")
+    for body_words in (50, 2_000):
+        single, batch = batch_render_us(renders, body_words)
+        print(f"{body_words:<12}{single:>11.1f}{batch:>16.1f}")
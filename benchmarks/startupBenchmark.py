@@ -0,0 +1,88 @@
+"""
+Measure the startup cost of the submit path with `python -X importtime`.
+
+Each run starts a fresh interpreter that builds a PyPost and submits one
+letter, then reports wall time, cumulative import time and whether any of
+the mail or AI client stacks were imported along the way (they should not be).
+
+Usage: python3 startupBenchmark.py [runs]
+"""
+import sys
+import os
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_PACKAGES = ("googleapiclient", "google_auth_oauthlib", "google_auth_httplib2", "httplib2", "openai")
+
+SUBMIT_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+from modules.pypost import PyPost
+pypost = PyPost(db_path={db_path!r}, postal_info_path={postal_info!r}, template_cache_dir={template_cache!r})
+pypost.submit_letter({letter_path!r})
+pypost.db.close()
+heavy = sorted(name for name in sys.modules if name.split(".")[0] in {heavy!r})
+print("HEAVY:" + ",".join(heavy))
+"""
+
+# "import time: self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_submit(tmp: str, run: int) -> dict:
+    letter_path = os.path.join(tmp, f"letter-{run}.txt")
+    with open(letter_path, "w", encoding="utf-8") as f:
+        f.write("Querida, hoy pienso en ti.\n")
+    script = SUBMIT_SCRIPT.format(
+        root=str(PROJECT_ROOT),
+        db_path=os.path.join(tmp, f"startup-{run}.db"),
+        postal_info=str(PROJECT_ROOT / "tests/test_data/mock_postal_info.json"),
+        template_cache=os.path.join(tmp, "template_cache"),
+        letter_path=letter_path,
+        heavy=HEAVY_PACKAGES,
+    )
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                          capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    import_us = 0
+    slowest = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 1:  # top-level imports; their cumulative times cover the nested ones
+            import_us += cumulative
+            slowest.append((cumulative, name))
+    heavy = next(line[len("HEAVY:"):] for line in proc.stdout.splitlines() if line.startswith("HEAVY:"))
+    return {
+        "wall_ms": wall * 1000,
+        "import_ms": import_us / 1000,
+        "slowest": sorted(slowest, reverse=True)[:5],
+        "heavy": [name for name in heavy.split(",") if name],
+    }
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_submit(tmp, run) for run in range(runs)]
+
+    print(f"submit path, {runs} runs")
+    print(f"wall time   median {statistics.median(r['wall_ms'] for r in results):8.1f} ms")
+    print(f"import time median {statistics.median(r['import_ms'] for r in results):8.1f} ms")
+    print("slowest top-level imports (last run):")
+    for cumulative, name in results[-1]["slowest"]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    heavy = sorted({name for r in results for name in r["heavy"]})
+    if heavy:
+        print("FAIL: submit imported " + ", ".join(heavy))
+        sys.exit(1)
+    print("PASS: submit did not import the Gmail or OpenAI clients")
@@ -0,0 +1,142 @@
+"""
+End-to-end throughput of submit_letter and send_pending_letters, offline.
+
+Each scale runs in a fresh interpreter (so peak RSS is per scale) against a
+temporary database, with FakeEmailSender and FakeAiTextGenerator in place of
+Gmail and OpenAI. Letters are synthetic .txt files submitted one by one with
+submit_letter; their schedules are then moved into the past so the whole
+backlog is due, and send_pending_letters delivers it.
+
+Usage: python3 throughputBenchmark.py [--scales 1000,10000,100000] [--json results.json]
+           [--send-latency-ms 0] [--ai-latency-ms 0] [--error-rate 0] [--workers 1] [--lookahead 0]
+           [--defer-rendering]
+"""
+import sys
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+WORDS = ("querida", "carta", "hoy", "pienso", "en", "ti", "mucho", "siempre", "amor", "luna", "mar", "cielo")
+STAGES = ("submit", "subject", "render", "send", "mark")
+
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def write_letters(letters_dir: Path, count: int) -> list[Path]:
+    rng = random.Random(42)
+    paths = []
+    for i in range(count):
+        path = letters_dir / f"letter-{i:06d}.txt"
+        path.write_text(" ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 400))), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def run_scale(args) -> dict:
+    from benchmarks.fakeServices import FakeEmailSender, FakeAiTextGenerator
+    from modules.pypost import PyPost
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        letters_dir = tmp / "letters"
+        letters_dir.mkdir()
+        paths = write_letters(letters_dir, args.scale)
+
+        pypost = PyPost(db_path=str(tmp / "throughput.db"),
+                        postal_info_path=PROJECT_ROOT / "tests/test_data/mock_postal_info.json",
+                        send_rate=None, ai_rate=None, send_attempts=1,
+                        defer_rendering=args.defer_rendering, render_cache_dir=tmp / "render_cache",
+                        template_cache_dir=tmp / "template_cache")
+        pypost.email_sender = FakeEmailSender(args.send_latency_ms / 1000, args.jitter, args.error_rate)
+        pypost.ai_text_generator = FakeAiTextGenerator(args.ai_latency_ms / 1000, args.jitter, args.error_rate)
+
+        # PyPost reports every letter on stdout; keep that out of the JSON.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for path in paths:
+                with pypost.timings.measure("submit"):
+                    pypost.submit_letter(path)
+            submit_seconds = time.perf_counter() - start
+
+            with pypost.db.conn:
+                pypost.db.conn.execute("UPDATE letters SET scheduled_delivery_ts = 0")
+
+            start = time.perf_counter()
+            sent = pypost.send_pending_letters(workers=args.workers, lookahead=args.lookahead)
+            send_seconds = time.perf_counter() - start
+        summary = pypost.timings.summary()
+        pypost.db.close()
+        db_mib = (tmp / "throughput.db").stat().st_size / (1024 * 1024)
+
+    return {
+        "letters": args.scale,
+        "delivered": len(sent),
+        "submit_letters_per_s": args.scale / submit_seconds,
+        "send_letters_per_s": args.scale / send_seconds,
+        "submit_s": submit_seconds,
+        "send_s": send_seconds,
+        "peak_rss_mib": peak_rss_mib(),
+        "db_mib": db_mib,
+        "stages": {stage: {"p50_ms": stats["p50_ms"], "p99_ms": stats["p99_ms"], "count": stats["count"]}
+                   for stage, stats in summary.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end throughput benchmark.")
+    parser.add_argument("--scales", default="1000,10000,100000")
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)  # child process: run one scale
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--send-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ai-latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency jitter as a fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--lookahead", type=int, default=0)
+    parser.add_argument("--defer-rendering", action="store_true", help="Store letters unrendered (render at send)")
+    args = parser.parse_args()
+
+    if args.scale:
+        print(json.dumps(run_scale(args)))
+        return
+
+    child_args = sys.argv[1:]
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("scale", "json", "scales")},
+        "runs": [],
+    }
+    for scale in (int(scale) for scale in args.scales.split(",")):
+        proc = subprocess.run([sys.executable, __file__, *child_args, "--scale", str(scale)],
+                              capture_output=True, text=True, check=True, cwd=PROJECT_ROOT)
+        results["runs"].append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'letters':>8}{'submit/s':>10}{'send/s':>9}{'RSS MiB':>9}{'DB MiB':>8}  " +
+          "".join(f"{stage + ' p50/p99 ms':>22}" for stage in STAGES))
+    for run in results["runs"]:
+        stages = "".join(
+            f"{run['stages'][stage]['p50_ms']:>13.2f}/{run['stages'][stage]['p99_ms']:<8.2f}"
+            if stage in run["stages"] else f"{'-':>22}"
+            for stage in STAGES
+        )
+        print(f"{run['letters']:>8}{run['submit_letters_per_s']:>10.0f}{run['send_letters_per_s']:>9.0f}"
+              f"{run['peak_rss_mib']:>9.1f}{run['db_mib']:>8.1f}  {stages}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
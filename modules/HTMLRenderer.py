@@ -1,16 +1,203 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import weakref
 from pathlib import Path
-from jinja2 import Template
-from typing import Any, Dict
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, nodes
+from typing import Any, Dict, Iterator, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# Where PyPost keeps compiled template bytecode, shared by every process using the
+# templates. Renderers built directly compile in memory unless given a folder.
+BYTECODE_CACHE_DIR = PROJECT_ROOT / "data/template_cache"
+
+# One Environment per (template folder, bytecode cache folder), and one
+# compiled Template per resolved template path, shared by all renderers.
+_environments: Dict[tuple, Environment] = {}
+_templates: Dict[Path, Template] = {}
+# mtime of each template file when its cached Template was compiled, and
+# the sha256 of the source it was compiled from.
+_template_mtimes: Dict[Path, Optional[int]] = {}
+_template_hashes: Dict[Path, str] = {}
+_cache_lock = threading.Lock()
+# Source of each compiled Template, and the variables it only ever outputs
+# as a bare {{ name }} (worked out on first render_many).
+_template_sources = weakref.WeakKeyDictionary()
+_template_splice_names = weakref.WeakKeyDictionary()
+
+# Stand-in for per-item values when render_many renders a shared frame.
+SPLICE_MARKER = "\x00pypost-splice-{}\x00"
+SPLICE_PATTERN = re.compile(re.escape(SPLICE_MARKER).replace(re.escape("{}"), r"(\d+)"))
+
+
+def get_environment(template_dir: Path, bytecode_cache_dir: Optional[Path] = None) -> Environment:
+    """Return the shared Environment loading templates from `template_dir`."""
+    key = (Path(template_dir), bytecode_cache_dir and Path(bytecode_cache_dir))
+    with _cache_lock:
+        environment = _environments.get(key)
+        if environment is None:
+            bytecode_cache = None
+            if bytecode_cache_dir is not None:
+                try:
+                    Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+                    bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache_dir))
+                except OSError:
+                    pass  # Read-only checkout: compile in memory only.
+            # Letters are plain text pasted into HTML on purpose, so no autoescaping.
+            # Templates are cached below, so the per-lookup mtime check is off.
+            environment = _environments[key] = Environment(
+                loader=FileSystemLoader(str(template_dir)),
+                bytecode_cache=bytecode_cache,
+                autoescape=False,
+                auto_reload=False,
+            )
+        return environment
+
+
+def _file_mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _compile(path: Path, bytecode_cache_dir: Optional[Path]) -> tuple[Template, Optional[int], str]:
+    environment = get_environment(path.parent, bytecode_cache_dir)
+    # Stat before reading, so an edit landing in between is still seen as newer.
+    mtime = _file_mtime(path)
+    # The steps of Loader.load, keeping the source so its hash matches the compiled
+    # code. Not Environment.get_template: _templates is the cache, its own would go stale on reload.
+    source, filename, uptodate = environment.loader.get_source(environment, path.name)
+    bytecode_cache = environment.bytecode_cache
+    bucket = bytecode_cache.get_bucket(environment, path.name, filename, source) if bytecode_cache else None
+    code = bucket.code if bucket else None
+    if code is None:
+        code = environment.compile(source, path.name, filename)
+        if bucket:
+            bucket.code = code
+            bytecode_cache.set_bucket(bucket)
+    template = environment.template_class.from_code(environment, code, environment.make_globals(None), uptodate)
+    _template_sources[template] = source
+    return template, mtime, hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def splice_names(template: Template) -> frozenset:
+    """
+    Variables `template` only uses as a bare {{ name }} output, so that their
+    rendered text is exactly their value. Empty when that can't be told.
+    """
+    names = _template_splice_names.get(template)
+    if names is None:
+        source = _template_sources.get(template)
+        names = frozenset()
+        if source is not None:
+            ast = template.environment.parse(source)
+            # Other templates, and blocks filtering or escaping their body, could change the text.
+            if not any(ast.find_all((nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport, nodes.FilterBlock,
+                                     nodes.ScopedEvalContextModifier))):
+                bare = [child.name for output in ast.find_all(nodes.Output)
+                        for child in output.nodes if isinstance(child, nodes.Name)]
+                used = [node.name for node in ast.find_all(nodes.Name)]
+                names = frozenset(name for name in bare if used.count(name) == bare.count(name))
+        _template_splice_names[template] = names
+    return names
+
+
+def get_template(template_path: str, bytecode_cache_dir: Optional[Path] = None) -> Template:
+    """Return the compiled template for `template_path`, compiling it on first use."""
+    path = Path(template_path).resolve()
+    template = _templates.get(path)
+    if template is None:
+        template, mtime, source_hash = _compile(path, bytecode_cache_dir)
+        with _cache_lock:
+            if path not in _templates:
+                _templates[path] = template
+                _template_mtimes[path] = mtime
+                _template_hashes[path] = source_hash
+            template = _templates[path]
+    return template
+
+
+def reload_template(template_path: str, bytecode_cache_dir: Optional[Path] = None) -> Template:
+    """Recompile `template_path` from disk and replace its shared cached copy."""
+    path = Path(template_path).resolve()
+    template, mtime, source_hash = _compile(path, bytecode_cache_dir)
+    with _cache_lock:
+        _templates[path] = template
+        _template_mtimes[path] = mtime
+        _template_hashes[path] = source_hash
+    return template
+
+
+def template_mtime(template_path: str) -> Optional[int]:
+    """mtime (ns) of the file the cached template for `template_path` was compiled from."""
+    return _template_mtimes.get(Path(template_path).resolve())
+
+
+def template_hash(template_path: str) -> Optional[str]:
+    """sha256 (hex) of the source the cached template for `template_path` was compiled from."""
+    return _template_hashes.get(Path(template_path).resolve())
+
+
+def clear_template_cache():
+    """Forget every compiled template and environment (the on-disk bytecode cache is kept)."""
+    with _cache_lock:
+        _templates.clear()
+        _template_mtimes.clear()
+        _template_hashes.clear()
+        _environments.clear()
 
 
 class HTMLRenderer:
-    def __init__(self, template_path: str):
+    def __init__(self, template_path: str, bytecode_cache_dir: Optional[str] = None,
+                 auto_reload: bool = False, reload_interval: float = 2.0):
+        """
+        Args:
+            auto_reload: Pick up edits to the template file without a restart,
+                for long-running processes.
+            reload_interval: Minimum seconds between two mtime checks, so a
+                busy renderer stats the file at most once per interval.
+        """
         self.template_path = Path(template_path)
+        self.bytecode_cache_dir = bytecode_cache_dir
+        self.auto_reload = auto_reload
+        self.reload_interval = reload_interval
         self.template = self._load_template()
+        # The shared template may predate this renderer, so compare against its source mtime.
+        self._mtime = template_mtime(self.template_path)
+        self._source_hash = template_hash(self.template_path)
+        self._next_check = time.monotonic() + reload_interval
 
     def _load_template(self) -> Template:
-        with open(self.template_path, "r", encoding="utf-8") as f:
-            return Template(f.read())
+        return get_template(self.template_path, self.bytecode_cache_dir)
+
+    def _check_for_changes(self):
+        self._next_check = time.monotonic() + self.reload_interval
+        mtime = _file_mtime(self.template_path)
+        # None: file missing mid-save (e.g. replaced by rename); keep the current template.
+        if mtime is None or mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            if template_mtime(self.template_path) == mtime:
+                self.template = get_template(self.template_path, self.bytecode_cache_dir)  # another renderer reloaded it
+            else:
+                self.template = reload_template(self.template_path, self.bytecode_cache_dir)
+            self._source_hash = template_hash(self.template_path)
+        except Exception as e:
+            # A broken edit must not take a running sender down; the next save is picked up again.
+            print(f"Could not reload template {self.template_path}: {e}")
+
+    @property
+    def source_hash(self) -> str:
+        """
+        sha256 (hex) of the template source this renderer renders with; it
+        changes when an edit is picked up, so it can key cached renderings.
+        """
+        self._current_template()
+        return self._source_hash
 
     def render(self, context: Dict[str, Any]) -> str:
         """
@@ -22,4 +209,66 @@ class HTMLRenderer:
         Returns:
             str: The rendered HTML as a string.
         """
-        return self.template.render(**context)
+        return self._current_template().render(**context)
+
+    def iter_render(self, context: Dict[str, Any]) -> Iterator[str]:
+        """
+        Renders the template piece by piece (Jinja's generate mode), so a long
+        letter can be written out or attached without building the whole string.
+        """
+        return self._current_template().generate(**context)
+
+    def render_to(self, stream, context: Dict[str, Any], encoding: Optional[str] = None):
+        """
+        Renders the template straight into `stream`: a text stream, or a binary
+        one when `encoding` is given (e.g. "utf-8").
+        """
+        for chunk in self.iter_render(context):
+            stream.write(chunk.encode(encoding) if encoding else chunk)
+
+    def render_many(self, contexts: list[Dict[str, Any]], shared: Optional[Dict[str, Any]] = None,
+                    variable_keys: tuple = ("letter_name", "letter_contents")) -> list[str]:
+        """
+        Renders many contexts, in order, each on top of the `shared` context.
+
+        When the template only outputs `variable_keys` as bare {{ name }}
+        (see splice_names), contexts that differ only in those values share one
+        render of the rest of the template, and each value is spliced into it.
+        Otherwise every context is rendered in full.
+        """
+        template = self._current_template()
+        shared = shared or {}
+        if not set(variable_keys) <= splice_names(template):
+            return [template.render({**shared, **context}) for context in contexts]
+
+        results = [None] * len(contexts)
+        groups = {}
+        for index, context in enumerate(contexts):
+            values = [context.get(key, shared.get(key)) for key in variable_keys]
+            invariant = tuple(sorted((key, value) for key, value in context.items() if key not in variable_keys))
+            try:
+                hash(invariant)
+            except TypeError:
+                invariant = None
+            if invariant is None or not all(isinstance(value, str) for value in values):
+                results[index] = template.render({**shared, **context})
+            else:
+                groups.setdefault(invariant, []).append(index)
+
+        markers = {key: SPLICE_MARKER.format(i) for i, key in enumerate(variable_keys)}
+        for indexes in groups.values():
+            # Odd positions hold marker numbers, even positions the template text around them.
+            frame = SPLICE_PATTERN.split(template.render({**shared, **contexts[indexes[0]], **markers}))
+            slots = [(i, variable_keys[int(frame[i])]) for i in range(1, len(frame), 2)]
+            for index in indexes:
+                context = contexts[index]
+                pieces = frame.copy()
+                for i, key in slots:
+                    pieces[i] = context[key] if key in context else shared[key]
+                results[index] = "".join(pieces)
+        return results
+
+    def _current_template(self) -> Template:
+        if self.auto_reload and time.monotonic() >= self._next_check:
+            self._check_for_changes()
+        return self.template
@@ -1,16 +1,17 @@
-import openai
-
 class AiTextGenerator:
-    def __init__(self, api_key: str, model: str = "gpt-5"):
+    def __init__(self, api_key: str, model: str = "gpt-5", timeout: float = 60):
+        import openai  # deferred: the SDK is slow to import and only needed here
+
         self.api_key = api_key
         self.model = model
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # Hard per-request timeout; the SDK's own retries are off since callers retry with backoff.
+        self.client = openai.OpenAI(api_key=self.api_key, timeout=timeout, max_retries=0)
 
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        options = {"timeout": timeout} if timeout is not None else {}
         response = self.client.responses.create(
             model=self.model,
-            input=prompt
+            input=prompt,
+            **options
         )
         return response.output_text
-
-
@@ -0,0 +1,80 @@
+import hashlib
+import zlib
+from pathlib import Path
+from typing import Optional, Union
+
+# Tags prefixed to compressed values. Uncompressed values stay TEXT, so a
+# database may mix plain and compressed rows and every row stays readable.
+ZLIB_TAG = b"z"
+ZDICT_TAG = b"d"
+DICT_ID_SIZE = 8
+# zlib only looks back 32 KiB, so a longer dictionary is wasted.
+MAX_ZDICT_SIZE = 32 * 1024
+
+
+def dictionary_id(zdict: bytes) -> bytes:
+    return hashlib.sha256(zdict).digest()[:DICT_ID_SIZE]
+
+
+def dictionary_from_template(template_path: str) -> bytes:
+    """
+    Build a zlib preset dictionary from a template file. Rendered letters
+    repeat the template boilerplate, so it makes a good shared dictionary.
+    The tail is kept because zlib favours the end of the dictionary.
+    """
+    return Path(template_path).read_bytes()[-MAX_ZDICT_SIZE:]
+
+
+class BlobCodec:
+    """
+    Compresses the large letter columns on write and decompresses them on read.
+
+    mode: None stores text as-is, "zlib" uses plain zlib and "zdict" uses zlib
+    with a shared preset dictionary (see dictionary_from_template).
+    decode() understands every format regardless of mode, as long as any
+    dictionary used by a stored value has been registered.
+    """
+
+    MODES = (None, "zlib", "zdict")
+
+    def __init__(self, mode: Optional[str] = "zlib", zdict: bytes = None, level: int = 6):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        if mode == "zdict" and not zdict:
+            raise ValueError("zdict mode needs a dictionary")
+        self.mode = mode
+        self.level = level
+        self.dictionaries: dict[bytes, bytes] = {}
+        self.zdict_id = self.register_dictionary(zdict) if zdict else None
+
+    def register_dictionary(self, zdict: bytes) -> bytes:
+        zdict = bytes(zdict)
+        zdict_id = dictionary_id(zdict)
+        self.dictionaries[zdict_id] = zdict
+        return zdict_id
+
+    def encode(self, text: str) -> Union[str, bytes]:
+        """Return the stored form of `text`: compressed bytes, or the text itself if that is smaller."""
+        if self.mode is None:
+            return text
+        data = text.encode("utf-8")
+        if self.mode == "zlib":
+            encoded = ZLIB_TAG + zlib.compress(data, self.level)
+        else:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionaries[self.zdict_id])
+            encoded = ZDICT_TAG + self.zdict_id + compressor.compress(data) + compressor.flush()
+        return encoded if len(encoded) < len(data) else text
+
+    def decode(self, value: Union[str, bytes]) -> str:
+        if value is None or isinstance(value, str):
+            return value
+        tag, payload = value[:1], value[1:]
+        if tag == ZLIB_TAG:
+            return zlib.decompress(payload).decode("utf-8")
+        if tag == ZDICT_TAG:
+            zdict_id, payload = payload[:DICT_ID_SIZE], payload[DICT_ID_SIZE:]
+            if zdict_id not in self.dictionaries:
+                raise KeyError(f"Unknown compression dictionary {zdict_id.hex()}")
+            decompressor = zlib.decompressobj(zdict=self.dictionaries[zdict_id])
+            return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+        raise ValueError(f"Unknown blob encoding tag {tag!r}")
@@ -0,0 +1,225 @@
+import base64
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.base import MIMEBase
+from email import encoders
+
+# Attachment chunk size for streamed MIME writing; a multiple of 57 bytes so
+# every chunk base64-encodes to whole 76-character lines.
+STREAM_CHUNK_SIZE = 57 * 1024
+
+
+def is_streamed(data) -> bool:
+    """
+    Attachment data other than bytes/str: a binary/text file object, an
+    iterable of chunks, or a callable returning either. Pass a callable (e.g.
+    lambda: renderer.iter_render(context)) when the message may be sent more
+    than once, such as under call_with_retry, since each send calls it again.
+    """
+    return not isinstance(data, (bytes, bytearray, str))
+
+
+def attachment_chunks(data) -> Iterator[bytes]:
+    """Yield attachment data as bytes chunks of at most STREAM_CHUNK_SIZE bytes or characters, whatever form it was given in."""
+    source = data() if callable(data) else data
+    if isinstance(source, (bytes, bytearray, str)):
+        chunks = (source,)
+    elif hasattr(source, "read"):
+        chunks = iter(lambda: source.read(STREAM_CHUNK_SIZE), source.read(0))
+    else:
+        chunks = source
+    for chunk in chunks:
+        # Large chunks (a whole letter as one str) are split so they're never encoded in one piece.
+        for start in range(0, len(chunk), STREAM_CHUNK_SIZE):
+            piece = chunk[start:start + STREAM_CHUNK_SIZE]
+            yield piece.encode("utf-8") if isinstance(piece, str) else bytes(piece)
+
+
+def build_mime_message(to: str,
+                       subject: str,
+                       body: str,
+                       body_type: str='plain',
+                       attachment_paths: list[str]=None,
+                       bcc: str=None,
+                       attachments: list[tuple[str, bytes, str]]=None,
+                       sender: str=None,
+                       _streamed: dict=None) -> MIMEMultipart:
+    """
+    Build the MIME message shared by every transport. `attachments` are
+    (filename, data, mime_type) tuples, sent alongside any files listed in
+    `attachment_paths`; data is bytes, str or a stream (see is_streamed),
+    which is read into memory here. write_mime_message avoids that.
+    """
+    message = MIMEMultipart()
+    message['to'] = to
+    if sender is not None: message['from'] = sender
+    message['subject'] = subject
+    if bcc is not None: message['bcc'] = bcc
+
+    if body_type.lower() not in ['plain', 'html']:
+        raise ValueError("body_type must be either 'plain' or 'html'")
+
+    message.attach(MIMEText(body, body_type.lower()))
+
+    if attachment_paths:
+        for attachment_path in attachment_paths:
+            if os.path.exists(attachment_path):
+                filename = os.path.basename(attachment_path)
+
+                with open(attachment_path, "rb") as attachment:
+                    part = MIMEBase("application", "octet-stream")
+                    part.set_payload(attachment.read())
+
+                encoders.encode_base64(part)
+
+                part.add_header(
+                    "Content-Disposition",
+                    f"attachment; filename= {filename}",
+                )
+
+                message.attach(part)
+            else:
+                raise FileNotFoundError(f"{attachment_path} not found")
+
+    for filename, data, mime_type in attachments or []:
+        maintype, subtype = mime_type.split("/", 1)
+        part = MIMEBase(maintype, subtype)
+        if is_streamed(data) and _streamed is not None:
+            # Placeholder payload, replaced by the streamed base64 body on write.
+            marker = f"pypost-attachment-{uuid.uuid4().hex}"
+            _streamed[marker] = data
+            part.set_payload(marker)
+            part["Content-Transfer-Encoding"] = "base64"
+        else:
+            part.set_payload(b"".join(attachment_chunks(data)))
+            encoders.encode_base64(part)
+        part.add_header(
+            "Content-Disposition",
+            f"attachment; filename= {filename}",
+        )
+        message.attach(part)
+
+    return message
+
+
+def _write_base64(stream: BinaryIO, chunks: Iterator[bytes]):
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        whole_lines = len(pending) - len(pending) % 57
+        if whole_lines:
+            stream.write(base64.encodebytes(pending[:whole_lines]))
+            pending = pending[whole_lines:]
+    if pending:
+        stream.write(base64.encodebytes(pending))
+
+
+def write_mime_message(stream: BinaryIO,
+                       to: str,
+                       subject: str,
+                       body: str,
+                       body_type: str='plain',
+                       attachment_paths: list[str]=None,
+                       bcc: str=None,
+                       attachments: list[tuple[str, bytes, str]]=None,
+                       sender: str=None):
+    """
+    Write the message build_mime_message would build to a binary stream.
+    Streamed attachments are read and base64-encoded chunk by chunk straight
+    into `stream`, so a long letter is never held whole in memory.
+    """
+    streamed = {}
+    message = build_mime_message(to, subject, body, body_type, attachment_paths, bcc, attachments, sender,
+                                 _streamed=streamed)
+    raw = message.as_bytes()
+    position = 0
+    for marker, data in streamed.items():
+        start = raw.index(marker.encode("ascii"), position)
+        stream.write(raw[position:start])
+        _write_base64(stream, attachment_chunks(data))
+        # The encoded body already ends with a newline; skip the one after the marker.
+        position = start + len(marker) + 1
+    stream.write(raw[position:])
+
+
+class DeliveryTransport:
+    """
+    Interface for the ways a letter can leave the post office.
+
+    Implementations provide send_email; send_batch and close have defaults
+    that suit transports without batching or long-lived connections.
+    """
+
+    def send_email(self,
+                   to: str,
+                   subject: str,
+                   body: str,
+                   body_type: str='plain',
+                   attachment_paths: list[str]=None,
+                   bcc: str=None,
+                   attachments: list[tuple[str, bytes, str]]=None):
+        raise NotImplementedError
+
+    def send_batch(self, messages: list[dict], batch_size: int = None) -> list[dict]:
+        """
+        Send many messages, one send_email call each.
+
+        Returns:
+            list[dict]: One {"response", "error"} dict per message, in input order.
+                Exactly one of the two is None.
+        """
+        results = []
+        for message in messages:
+            try:
+                results.append({"response": self.send_email(**message), "error": None})
+            except Exception as e:
+                results.append({"response": None, "error": e})
+        return results
+
+    def close(self):
+        """Release any connection held by the transport."""
+
+
+def transport_from_config(config_path: str, **gmail_defaults) -> DeliveryTransport:
+    """
+    Build the transport described by the JSON file at `config_path`.
+
+    The "type" key picks the implementation, the other keys are passed to its
+    constructor:
+        {"type": "gmail"}                                        (default)
+        {"type": "smtp", "host": ..., "port": 587, "username": ..., "password": ...}
+        {"type": "maildir", "path": ...} / {"type": "mbox", "path": ...}
+    A missing file means Gmail. `gmail_defaults` are the EmailSender
+    arguments used unless the file overrides them.
+    """
+    config_path = Path(config_path)
+    config = {}
+    if config_path.exists():
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    transport_type = config.pop("type", "gmail")
+
+    if transport_type == "gmail":
+        from modules.emailSender import EmailSender
+        options = {**gmail_defaults, **config}
+        return EmailSender(
+            options.pop("client_secret_file"),
+            options.pop("token_folder_path"),
+            options.pop("api_name", "gmail"),
+            options.pop("api_version", "v1"),
+            *options.pop("scopes", ["https://mail.google.com/"]),
+            **options
+        )
+    if transport_type == "smtp":
+        from modules.smtpTransport import SmtpTransport
+        return SmtpTransport(**config)
+    if transport_type in ("maildir", "mbox"):
+        from modules.localMailSink import LocalMailSink
+        return LocalMailSink(mailbox_format=transport_type, **config)
+    raise ValueError(f"Unknown transport type: {transport_type!r}")
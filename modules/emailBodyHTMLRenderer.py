@@ -1,14 +1,10 @@
-from pathlib import Path
-from jinja2 import Template
+from modules.HTMLRenderer import HTMLRenderer
 
 class EmailBodyHTMLRenderer:
-    def __init__(self, template_path: str):
+    def __init__(self, template_path: str, bytecode_cache_dir: str = None):
+        # Thin view over HTMLRenderer: the compiled template is shared with it.
         self.template_path = template_path
-        self.template = self._load_template()
-
-    def _load_template(self) -> Template:
-        with open(self.template_path, "r", encoding="utf-8") as f:
-            return Template(f.read())
+        self.renderer = HTMLRenderer(template_path, bytecode_cache_dir)
 
     def render(self,
                recipient_name: str,
@@ -16,11 +12,11 @@ class EmailBodyHTMLRenderer:
                received_date: str,
                scheduled_delivery: str,
                sent_date: str) -> str:
-        html = self.template.render(
+        html = self.renderer.render(dict(
             recipient_name=recipient_name,
             created_date=created_date,
             received_date=received_date,
             scheduled_delivery=scheduled_delivery,
             sent_date=sent_date
-        )
+        ))
         return html
\ No newline at end of file
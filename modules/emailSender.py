@@ -1,32 +1,92 @@
 import os 
 import base64
+import tempfile
+import hashlib
+import threading
+import time
 from pathlib import Path
 
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+from modules.deliveryTransport import DeliveryTransport, build_mime_message, is_streamed, write_mime_message
 
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+# Gmail accepts at most 100 calls per batch request.
+GMAIL_BATCH_LIMIT = 100
+DISCOVERY_CACHE_TTL = 24 * 3600
+# Messages with streamed attachments are spooled in memory up to this size, then on disk,
+# and uploaded to Gmail in chunks of UPLOAD_CHUNK_SIZE.
+SPOOL_MAX_SIZE = 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
-class EmailSender:
+class DiscoveryFileCache:
+    """
+    On-disk cache for API discovery documents, usable as the `cache` argument
+    of googleapiclient.discovery.build. Entries expire `ttl` seconds after
+    they were written.
+    """
+
+    def __init__(self, cache_dir: str, ttl: int = DISCOVERY_CACHE_TTL):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]}.json"
+
+    def get(self, url: str):
+        path = self._path(url)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def set(self, url: str, content: str):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        # Write then rename so concurrent processes never read a partial document.
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+class EmailSender(DeliveryTransport):
     def __init__(self,
                 client_secret_file_path: str,
                 token_folder_path: str,
                 api_name: str,
                 api_version: str,
                 *scopes: list[str],
-                prefix: str=''):
-        self.service = self.create_service(client_secret_file_path,
-                                           token_folder_path,
-                                           api_name,
-                                           api_version,
-                                           scopes,
-                                           prefix)
+                prefix: str='',
+                service=None,
+                discovery_cache_dir: str=None,
+                discovery_cache_ttl: int=DISCOVERY_CACHE_TTL,
+                static_discovery: bool=False):
+        """
+        The OAuth flow and API client are deferred until the first send, so
+        constructing an EmailSender is free for runs that never send mail.
+
+        Args:
+            service: An already-built API client (e.g. backed by a mock HTTP transport).
+            discovery_cache_dir: Folder caching the discovery document for discovery_cache_ttl seconds.
+            static_discovery: Use the discovery document bundled with googleapiclient; no network fetch.
+        """
+        self.creds = None
+        # httplib2 connections are not thread-safe, so each thread gets its own.
+        self._local = threading.local()
+        self._service = service
+        self._service_lock = threading.Lock()
+        self._service_args = (client_secret_file_path, token_folder_path, api_name, api_version, scopes, prefix)
+        self.static_discovery = static_discovery
+        self.discovery_cache = DiscoveryFileCache(discovery_cache_dir, discovery_cache_ttl) if discovery_cache_dir else None
+
+    @property
+    def service(self):
+        """The API client, built (including OAuth) on first access."""
+        if self._service is None:
+            with self._service_lock:
+                if self._service is None:
+                    self._service = self.create_service(*self._service_args)
+        return self._service
 
     def create_service(self, client_secret_file_path: str,
                        token_folder_path: str,
@@ -34,6 +94,13 @@ class EmailSender:
                        api_version: str,
                        *scopes: list[str],
                        prefix=''):
+        # The Google client stack takes a noticeable part of startup time, so
+        # it is only imported once a service is actually needed.
+        from googleapiclient.discovery import build
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+
         CLIENT_SECRET_FILE = client_secret_file_path
         API_SERVICE_NAME = api_name
         API_VERSION = api_version
@@ -62,12 +129,20 @@ class EmailSender:
             
             with open(token_full_path, 'w') as token:
                 token.write(creds.to_json())
+        self.creds = creds
 
         try:
-            service = build(API_SERVICE_NAME,
-                            API_VERSION,
-                            credentials=creds,
-                            static_discovery=False)
+            if self.static_discovery:
+                service = build(API_SERVICE_NAME,
+                                API_VERSION,
+                                credentials=creds,
+                                static_discovery=True)
+            else:
+                service = build(API_SERVICE_NAME,
+                                API_VERSION,
+                                credentials=creds,
+                                static_discovery=False,
+                                cache=self.discovery_cache)
             #print(API_SERVICE_NAME, API_VERSION, 'Service created successfully')
             return service
         except Exception as e:
@@ -76,7 +151,34 @@ class EmailSender:
             if os.path.exists(token_full_path):
                 os.remove(token_full_path)
             return None
-        
+
+    def _thread_http(self):
+        """Return this thread's authorized HTTP connection, creating it on first use."""
+        if self.creds is None:
+            return None  # Injected service: let it use its own transport.
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            http = self._local.http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+        return http
+
+
+    def build_raw_message(self,
+                          to: str,
+                          subject: str,
+                          body: str,
+                          body_type: str='plain',
+                          attachment_paths: list[str]=None,
+                          bcc: str=None,
+                          attachments: list[tuple[str, bytes, str]]=None) -> str:
+        """
+        Build the base64url-encoded MIME message expected by the Gmail API.
+        `attachments` are in-memory (filename, data, mime_type) tuples, sent
+        alongside any files listed in `attachment_paths`.
+        """
+        message = build_mime_message(to, subject, body, body_type, attachment_paths, bcc, attachments)
+        return base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
 
     def send_email(self,
                    to: str,
@@ -84,43 +186,87 @@ class EmailSender:
                    body: str, 
                    body_type: str='plain',
                    attachment_paths: list[str]=None,
-                   bcc: str=None):
+                   bcc: str=None,
+                   attachments: list[tuple[str, bytes, str]]=None):
 
-        message = MIMEMultipart()
-        message['to'] = to
-        message['subject'] = subject
-        if bcc is not None: message['bcc'] = bcc
+        if any(is_streamed(data) for _, data, _ in attachments or []):
+            return self.send_streamed_email(to, subject, body, body_type, attachment_paths, bcc, attachments)
 
-        if body_type.lower() not in ['plain', 'html']:
-            raise ValueError("body_type must be either 'plain' or 'html'")
+        raw_message = self.build_raw_message(to, subject, body, body_type, attachment_paths, bcc, attachments)
         
-        message.attach(MIMEText(body, body_type.lower()))
+        sent_message = self.service.users().messages().send(
+            userId='me',
+            body = {'raw': raw_message}
+        ).execute(http=self._thread_http())
 
-        if attachment_paths:
-            for attachment_path in attachment_paths:
-                if os.path.exists(attachment_path):
-                    filename = os.path.basename(attachment_path)
+        return sent_message
 
-                    with open(attachment_path, "rb") as attachment:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(attachment.read())
+    def send_streamed_email(self,
+                            to: str,
+                            subject: str,
+                            body: str,
+                            body_type: str='plain',
+                            attachment_paths: list[str]=None,
+                            bcc: str=None,
+                            attachments: list=None):
+        """
+        Send a message whose attachments may be streams (file objects or chunk
+        iterators such as HTMLRenderer.iter_render). The MIME message is written
+        incrementally to a spool file and uploaded as message/rfc822 media in
+        chunks, instead of being base64url-encoded whole into the request body.
+        """
+        from googleapiclient.http import MediaIoBaseUpload
 
-                    encoders.encode_base64(part)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            write_mime_message(spool, to, subject, body, body_type, attachment_paths, bcc, attachments)
+            spool.seek(0)
+            media = MediaIoBaseUpload(spool, mimetype="message/rfc822", chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+            return self.service.users().messages().send(
+                userId='me',
+                body={},
+                media_body=media
+            ).execute(http=self._thread_http())
 
-                    part.add_header(
-                        "Content-Disposition",
-                        f"attachment; filename= {filename}",
-                    )
+    def send_batch(self, messages: list[dict], batch_size: int = GMAIL_BATCH_LIMIT, http=None) -> list[dict]:
+        """
+        Send many messages using Gmail batch requests, up to `batch_size` per HTTP round trip.
 
-                    message.attach(part)
-                else:
-                    raise FileNotFoundError(f"{attachment_path} not found")
-            
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-        
-        sent_message = self.service.users().messages().send(
-            userId='me',
-            body = {'raw': raw_message}
-        ).execute()
+        Args:
+            messages (list[dict]): send_email keyword arguments, one dict per message.
+            batch_size (int): Calls per batch request, capped at GMAIL_BATCH_LIMIT.
+            http: Optional transport for the batch requests, e.g. a googleapiclient HttpMock.
 
-        return sent_message
\ No newline at end of file
+        Returns:
+            list[dict]: One {"response", "error"} dict per message, in input order.
+                Exactly one of the two is None.
+        """
+        batch_size = min(batch_size, GMAIL_BATCH_LIMIT)
+        results = [None] * len(messages)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = {"response": response, "error": exception}
+
+        for start in range(0, len(messages), batch_size):
+            batch = self.service.new_batch_http_request(callback=callback)
+            queued = []
+            for index in range(start, min(start + batch_size, len(messages))):
+                try:
+                    raw_message = self.build_raw_message(**messages[index])
+                except Exception as e:
+                    results[index] = {"response": None, "error": e}
+                    continue
+                batch.add(
+                    self.service.users().messages().send(userId='me', body={'raw': raw_message}),
+                    request_id=str(index)
+                )
+                queued.append(index)
+            if not queued:
+                continue
+            try:
+                batch.execute(http=http or self._thread_http())
+            except Exception as e:
+                # The whole round trip failed; every message still unanswered shares the error.
+                for index in queued:
+                    if results[index] is None:
+                        results[index] = {"response": None, "error": e}
+        return results
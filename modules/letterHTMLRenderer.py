@@ -1,17 +1,13 @@
-from pathlib import Path
-from jinja2 import Template
+from modules.HTMLRenderer import HTMLRenderer
 
 class LetterHTMLRenderer:
-    def __init__(self, template_path: str):
+    def __init__(self, template_path: str, bytecode_cache_dir: str = None):
+        # Thin view over HTMLRenderer: the compiled template is shared with it.
         self.template_path = template_path
-        self.template = self._load_template()
-
-    def _load_template(self) -> Template:
-        with open(self.template_path, "r", encoding="utf-8") as f:
-            return Template(f.read())
+        self.renderer = HTMLRenderer(template_path, bytecode_cache_dir)
 
     def render(self, letter_contents: str, sender: dict, recipient: dict, letter_date: str) -> str:
-        html = self.template.render(
+        html = self.renderer.render(dict(
             letter_date=letter_date,
             letter_contents=letter_contents,
             sender_name=sender.get("name", ""),
@@ -28,5 +24,5 @@ class LetterHTMLRenderer:
             recipient_city_state=recipient.get("city_state", ""),
             recipient_country=recipient.get("country", ""),
             recipient_phone=recipient.get("phone", "")
-        )
+        ))
         return html
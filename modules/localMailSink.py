@@ -0,0 +1,68 @@
+import mailbox
+import threading
+import time
+
+from modules.deliveryTransport import DeliveryTransport, build_mime_message
+
+
+class LocalMailSink(DeliveryTransport):
+    """
+    Deliver letters into a local Maildir or mbox instead of sending them.
+
+    Nothing touches the network, so the whole submit/render/deliver pipeline
+    can be exercised at full speed on an offline machine, and the results
+    inspected with any mail client.
+    """
+
+    def __init__(self, path: str, mailbox_format: str = "maildir", sender: str = "pypost@localhost"):
+        if mailbox_format == "maildir":
+            self.mailbox = mailbox.Maildir(path, create=True)
+        elif mailbox_format == "mbox":
+            self.mailbox = mailbox.mbox(path, create=True)
+        else:
+            raise ValueError("mailbox_format must be 'maildir' or 'mbox'")
+        self.mailbox_format = mailbox_format
+        self.sender = sender
+        self._lock = threading.Lock()
+
+    def send_email(self,
+                   to: str,
+                   subject: str,
+                   body: str,
+                   body_type: str='plain',
+                   attachment_paths: list[str]=None,
+                   bcc: str=None,
+                   attachments: list[tuple[str, bytes, str]]=None):
+        message = build_mime_message(to, subject, body, body_type, attachment_paths, bcc, attachments,
+                                     sender=self.sender)
+        # mailbox objects are not thread-safe, and other sender processes may
+        # append to the same mbox, so mbox writes also hold the file lock.
+        with self._lock:
+            if self.mailbox_format == "mbox":
+                self._lock_mbox()
+                try:
+                    key = self.mailbox.add(message)
+                    self.mailbox.flush()
+                finally:
+                    self.mailbox.unlock()
+            else:
+                key = self.mailbox.add(message)
+        return {"id": key}
+
+    def _lock_mbox(self, timeout: float = 10.0):
+        # mailbox.lock() does not wait for another process to let go of the file.
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.mailbox.lock()
+                return
+            # FileExistsError: two threads of one process picked the same dot-lock temp name.
+            except (mailbox.ExternalClashError, FileExistsError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+
+    def close(self):
+        """Flush pending writes to disk; the sink stays usable afterwards."""
+        with self._lock:
+            self.mailbox.flush()
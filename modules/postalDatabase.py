@@ -1,19 +1,373 @@
+import hashlib
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Iterator, Optional
 import json
 import os
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # Allow running this file directly as the postal database CLI.
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.blobCodec import BlobCodec, dictionary_from_template
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+LETTER_COLUMNS = (
+    "letter_id",
+    "letter_name",
+    "creation_datetime",
+    "contents",
+    "html_contents",
+    "party_id",
+    "received_date",
+    "scheduled_delivery_datetime",
+    "delivery_datetime",
+    "status",
+    "received_ts",
+    "scheduled_delivery_ts",
+    "delivery_ts",
+    "lease_owner",
+    "lease_expires_ts",
+    "attempt_count",
+    "last_error",
+    "next_retry_ts",
+    "template_hash",
+)
+LETTER_SELECT = ", ".join(LETTER_COLUMNS)
+INSERT_LETTER_SQL = """
+    INSERT INTO letters (
+        letter_id, letter_name, creation_datetime, contents, html_contents, party_id,
+        received_date, scheduled_delivery_datetime, delivery_datetime, status,
+        received_ts, scheduled_delivery_ts, delivery_ts, template_hash
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Heavy columns that LetterRecord only loads on demand.
+LETTER_BODY_COLUMNS = ("contents", "html_contents")
+LETTER_METADATA_COLUMNS = tuple(c for c in LETTER_COLUMNS if c not in LETTER_BODY_COLUMNS)
+LETTER_METADATA_SELECT = ", ".join(LETTER_METADATA_COLUMNS)
+
+# Pragmas applied once when the connection is opened.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",       # ~16 MiB page cache
+    "PRAGMA mmap_size = 268435456",     # 256 MiB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Composite indexes backing the status/schedule queries. The scheduled index
+# also carries letter_id, letter_name and the display datetime so the summary
+# queries are covered. Created after migrations, so they may use any column.
+LETTER_INDEXES = (
+    """CREATE INDEX IF NOT EXISTS idx_letters_status_scheduled_ts
+       ON letters (status, scheduled_delivery_ts, letter_id, letter_name, scheduled_delivery_datetime)""",
+    """CREATE INDEX IF NOT EXISTS idx_letters_status_received_ts
+       ON letters (status, received_ts)""",
+    """CREATE INDEX IF NOT EXISTS idx_letters_status_creation_id
+       ON letters (status, creation_datetime, letter_id)""",
+)
+
+
+def party_key(postal_info: dict) -> tuple[str, str]:
+    """Return the canonical JSON of a postal_info dict and its content hash."""
+    canonical = json.dumps(postal_info, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return canonical, hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def to_epoch(value: Optional[str]) -> Optional[int]:
+    """Convert a local DATETIME_FORMAT string into integer epoch seconds."""
+    if value is None:
+        return None
+    return int(datetime.strptime(value, DATETIME_FORMAT).timestamp())
+
+
+def _migrate_epoch_columns(conn: sqlite3.Connection):
+    """v1: integer epoch columns for received/scheduled/delivered times."""
+    for column in ("received_ts", "scheduled_delivery_ts", "delivery_ts"):
+        conn.execute(f"ALTER TABLE letters ADD COLUMN {column} INTEGER")
+    # The TEXT columns hold local wall-clock time; 'utc' converts it like datetime.timestamp().
+    conn.execute("""
+        UPDATE letters SET
+            received_ts = CAST(strftime('%s', received_date, 'utc') AS INTEGER),
+            scheduled_delivery_ts = CAST(strftime('%s', scheduled_delivery_datetime, 'utc') AS INTEGER),
+            delivery_ts = CAST(strftime('%s', delivery_datetime, 'utc') AS INTEGER)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_letters_status_scheduled")
+    conn.execute("DROP INDEX IF EXISTS idx_letters_status_received")
+
+
+def _migrate_keyset_creation_index(conn: sqlite3.Connection):
+    """v2: replace the creation index with one that also orders by letter_id for keyset paging."""
+    conn.execute("DROP INDEX IF EXISTS idx_letters_status_creation")
+
+
+def _migrate_codec_dictionaries(conn: sqlite3.Connection):
+    """v3: table of shared compression dictionaries referenced by compressed letter columns."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS codec_dictionaries (
+            dict_id BLOB PRIMARY KEY,
+            zdict BLOB NOT NULL
+        )
+    """)
+
+
+def _migrate_parties_table(conn: sqlite3.Connection):
+    """
+    v4: move the per-row postal_info JSON into a deduplicated parties table
+    keyed by content hash; letters reference it through party_id.
+    SQLite can't swap a column in place, so letters is rebuilt (rowids kept).
+    """
+    conn.execute("""
+        CREATE TABLE parties (
+            party_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL UNIQUE,
+            postal_info TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE TEMP TABLE party_map (postal_info TEXT PRIMARY KEY, party_id INTEGER NOT NULL)")
+    for (postal_info,) in conn.execute("SELECT DISTINCT postal_info FROM letters").fetchall():
+        canonical, content_hash = party_key(json.loads(postal_info))
+        conn.execute(
+            "INSERT OR IGNORE INTO parties (content_hash, postal_info) VALUES (?, ?)", (content_hash, canonical)
+        )
+        conn.execute("""
+            INSERT INTO party_map (postal_info, party_id)
+            SELECT ?, party_id FROM parties WHERE content_hash = ?
+        """, (postal_info, content_hash))
+    conn.execute("""
+        CREATE TABLE letters_new (
+            letter_id TEXT PRIMARY KEY,
+            letter_name TEXT NOT NULL,
+            creation_datetime TEXT NOT NULL,
+            contents TEXT NOT NULL,
+            html_contents TEXT NOT NULL,
+            party_id INTEGER NOT NULL REFERENCES parties (party_id),
+            received_date TEXT NOT NULL,
+            scheduled_delivery_datetime TEXT NOT NULL,
+            delivery_datetime TEXT,
+            status TEXT NOT NULL,
+            received_ts INTEGER,
+            scheduled_delivery_ts INTEGER,
+            delivery_ts INTEGER
+        )
+    """)
+    conn.execute("""
+        INSERT INTO letters_new (
+            rowid, letter_id, letter_name, creation_datetime, contents, html_contents, party_id,
+            received_date, scheduled_delivery_datetime, delivery_datetime, status,
+            received_ts, scheduled_delivery_ts, delivery_ts
+        )
+        SELECT
+            l.rowid, l.letter_id, l.letter_name, l.creation_datetime, l.contents, l.html_contents, m.party_id,
+            l.received_date, l.scheduled_delivery_datetime, l.delivery_datetime, l.status,
+            l.received_ts, l.scheduled_delivery_ts, l.delivery_ts
+        FROM letters l JOIN party_map m ON m.postal_info = l.postal_info
+    """)
+    conn.execute("DROP TABLE letters")
+    conn.execute("ALTER TABLE letters_new RENAME TO letters")
+    conn.execute("DROP TABLE party_map")
+
+
+def _migrate_lease_columns(conn: sqlite3.Connection):
+    """v5: lease owner/expiry for letters claimed by a sender ('sending' status)."""
+    conn.execute("ALTER TABLE letters ADD COLUMN lease_owner TEXT")
+    conn.execute("ALTER TABLE letters ADD COLUMN lease_expires_ts INTEGER")
+
+
+def _migrate_full_text_search(conn: sqlite3.Connection):
+    """
+    v6: FTS5 index over letter names and contents, kept in sync by triggers.
+    FTS rows share the letters rowid. The triggers call letter_text(), which
+    PostalDatabase registers on its connection to decode compressed contents,
+    so letters must only be written through PostalDatabase.
+    """
+    conn.execute("""
+        CREATE VIRTUAL TABLE letters_fts USING fts5(
+            letter_name, contents, tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER letters_fts_insert AFTER INSERT ON letters BEGIN
+            INSERT INTO letters_fts (rowid, letter_name, contents)
+            VALUES (new.rowid, new.letter_name, letter_text(new.contents));
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER letters_fts_delete AFTER DELETE ON letters BEGIN
+            DELETE FROM letters_fts WHERE rowid = old.rowid;
+        END
+    """)
+    # Recompressing rewrites contents without changing the text; skip reindexing then.
+    conn.execute("""
+        CREATE TRIGGER letters_fts_update AFTER UPDATE OF letter_name, contents ON letters
+        WHEN old.letter_name IS NOT new.letter_name
+            OR letter_text(old.contents) IS NOT letter_text(new.contents)
+        BEGIN
+            UPDATE letters_fts SET letter_name = new.letter_name, contents = letter_text(new.contents)
+            WHERE rowid = old.rowid;
+        END
+    """)
+    conn.execute("""
+        INSERT INTO letters_fts (rowid, letter_name, contents)
+        SELECT rowid, letter_name, letter_text(contents) FROM letters
+    """)
+
+
+def _migrate_retry_columns(conn: sqlite3.Connection):
+    """v7: failed delivery attempts, the last error and when the letter may be retried."""
+    conn.execute("ALTER TABLE letters ADD COLUMN attempt_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE letters ADD COLUMN last_error TEXT")
+    conn.execute("ALTER TABLE letters ADD COLUMN next_retry_ts INTEGER")
+
+
+def _migrate_subject_pool(conn: sqlite3.Connection):
+    """
+    v8: pool of pre-generated email subjects. A subject is unique and is used
+    at most once (used_ts set when taken); used rows are kept so the same
+    subject is never added and sent again.
+    """
+    conn.execute("""
+        CREATE TABLE email_subjects (
+            subject_id INTEGER PRIMARY KEY,
+            subject TEXT NOT NULL UNIQUE,
+            created_ts INTEGER NOT NULL,
+            used_ts INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_email_subjects_unused ON email_subjects (subject_id) WHERE used_ts IS NULL")
+
+
+def _migrate_template_hash(conn: sqlite3.Connection):
+    """
+    v9: hash of the letter template a letter was submitted under, for letters
+    rendered at send time (their html_contents is empty). NULL for letters
+    rendered at submission.
+    """
+    conn.execute("ALTER TABLE letters ADD COLUMN template_hash TEXT")
+
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so append new steps to the end and never reorder existing ones.
+MIGRATIONS = (
+    _migrate_epoch_columns,
+    _migrate_keyset_creation_index,
+    _migrate_codec_dictionaries,
+    _migrate_parties_table,
+    _migrate_lease_columns,
+    _migrate_full_text_search,
+    _migrate_retry_columns,
+    _migrate_subject_pool,
+    _migrate_template_hash,
+)
+
+
+class LetterRecord:
+    """
+    Lightweight letter handle carrying only the metadata columns.
+
+    The body columns (contents, html_contents) are fetched from the database
+    on first access and kept afterwards; postal_info comes from the party
+    cache. Fields are read with record["field"], like the dicts returned by
+    the other PostalDatabase getters.
+    """
+
+    def __init__(self, db: "PostalDatabase", metadata: dict):
+        self._db = db
+        self._metadata = metadata
+        self._body = None
+
+    def _load_body(self) -> dict:
+        if self._body is None:
+            body = self._db.get_letter_body(self._metadata["letter_id"])
+            if body is None:
+                raise KeyError(f"Letter {self._metadata['letter_id']} no longer exists")
+            self._body = body
+        return self._body
+
+    @property
+    def body_loaded(self) -> bool:
+        return self._body is not None
+
+    def __getitem__(self, key: str):
+        if key in self._metadata:
+            return self._metadata[key]
+        if key == "postal_info":
+            return self._db.get_party(self._metadata["party_id"])
+        if key in LETTER_BODY_COLUMNS:
+            return self._load_body()[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> dict:
+        """Return the full letter as a plain dict, loading the body if needed."""
+        return {**self._metadata, **self._load_body(), "postal_info": self["postal_info"]}
+
+    def __repr__(self) -> str:
+        return f"LetterRecord({self._metadata['letter_id']!r}, {self._metadata['letter_name']!r})"
+
 
 class PostalDatabase:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, codec: Optional[BlobCodec] = None):
+        """
+        codec compresses contents and html_contents on write. Without one,
+        new rows are stored as plain text; compressed rows are read either way.
+        """
         self.db_path = db_path
+        self.codec = codec or BlobCodec(mode=None)
+        # Decoded postal_info per party_id, and party_id per content hash.
+        self._parties: dict[int, dict] = {}
+        self._party_ids: dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.conn = self._connect()
         self.init_database()
+        self._sync_codec_dictionaries()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the long-lived connection shared by every method of this instance."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        # Used by the full-text search triggers to index compressed contents.
+        conn.create_function("letter_text", 1, self.codec.decode, deterministic=True)
+        return conn
+
+    def close(self):
+        """Close the underlying connection. The instance is unusable afterwards."""
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _row_to_letter(self, row) -> dict:
+        letter = dict(zip(LETTER_COLUMNS, row))
+        letter["contents"] = self.codec.decode(letter["contents"])
+        letter["html_contents"] = self.codec.decode(letter["html_contents"])
+        letter["postal_info"] = self.get_party(letter["party_id"])
+        return letter
+
+    def _row_to_record(self, row) -> LetterRecord:
+        return LetterRecord(self, dict(zip(LETTER_METADATA_COLUMNS, row)))
 
     def init_database(self):
-        """Create the letters table if it doesn't exist."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
+        """Create the letters table, bring its schema up to date and ensure its indexes exist."""
+        with self._lock, self.conn:
+            self.conn.execute("""
                 CREATE TABLE IF NOT EXISTS letters (
                     letter_id TEXT PRIMARY KEY,
                     letter_name TEXT NOT NULL,
@@ -27,262 +381,538 @@ class PostalDatabase:
                     status TEXT NOT NULL
                 )
             """)
-            conn.commit()
+        # Migrations may need to decode rows compressed with a stored dictionary.
+        self._register_stored_dictionaries()
+        self.migrate()
+        with self._lock, self.conn:
+            for index in LETTER_INDEXES:
+                self.conn.execute(index)
+
+    def _register_stored_dictionaries(self):
+        with self._lock:
+            stored = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'codec_dictionaries'"
+            ).fetchone()
+            if stored:
+                for (zdict,) in self.conn.execute("SELECT zdict FROM codec_dictionaries"):
+                    self.codec.register_dictionary(zdict)
+
+    def _sync_codec_dictionaries(self):
+        """Persist the codec's dictionaries and register every stored one so any row can be decoded."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO codec_dictionaries (dict_id, zdict) VALUES (?, ?)",
+                list(self.codec.dictionaries.items())
+            )
+            for _, zdict in self.conn.execute("SELECT dict_id, zdict FROM codec_dictionaries"):
+                self.codec.register_dictionary(zdict)
+
+    def schema_version(self) -> int:
+        """Return the number of migrations applied to this database."""
+        with self._lock:
+            return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """Apply pending MIGRATIONS, each step in its own transaction together with its user_version bump."""
+        with self._lock:
+            version = self.schema_version()
+            for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                with self.conn:
+                    # Take the write lock before checking the version again, so two
+                    # processes opening the same database never both apply a step.
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    if self.conn.execute("PRAGMA user_version").fetchone()[0] >= target:
+                        continue
+                    migration(self.conn)
+                    self.conn.execute(f"PRAGMA user_version = {target}")
+
+    def _letter_params(self, letter_data: dict) -> tuple:
+        return (
+            letter_data['letter_id'],
+            letter_data['letter_name'],
+            letter_data['creation_datetime'],
+            self.codec.encode(letter_data['contents']),
+            self.codec.encode(letter_data['html_contents']),
+            self.get_party_id(letter_data['postal_info']),
+            letter_data['received_date'],
+            letter_data['scheduled_delivery_datetime'],
+            letter_data.get('delivery_datetime'),  # Can be None at insert
+            letter_data['status'],
+            letter_data.get('received_ts') or to_epoch(letter_data['received_date']),
+            letter_data.get('scheduled_delivery_ts') or to_epoch(letter_data['scheduled_delivery_datetime']),
+            letter_data.get('delivery_ts') or to_epoch(letter_data.get('delivery_datetime')),
+            letter_data.get('template_hash'),
+        )
+
+    def get_party_id(self, postal_info: dict) -> int:
+        """Return the parties row id for a postal_info dict, inserting it if it's new."""
+        canonical, content_hash = party_key(postal_info)
+        with self._lock:
+            party_id = self._party_ids.get(content_hash)
+            if party_id is None:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO parties (content_hash, postal_info) VALUES (?, ?)",
+                    (content_hash, canonical)
+                )
+                party_id = self.conn.execute(
+                    "SELECT party_id FROM parties WHERE content_hash = ?", (content_hash,)
+                ).fetchone()[0]
+                self._party_ids[content_hash] = party_id
+            return party_id
+
+    def get_party(self, party_id: int) -> dict:
+        """
+        Return the decoded postal_info of a party. The dict is cached and shared
+        by every letter of that party, so callers must treat it as read-only.
+        """
+        with self._lock:
+            postal_info = self._parties.get(party_id)
+            if postal_info is None:
+                row = self.conn.execute("SELECT postal_info FROM parties WHERE party_id = ?", (party_id,)).fetchone()
+                postal_info = self._parties[party_id] = json.loads(row[0])
+            return postal_info
 
     def insert_letter(self, letter_data: dict) -> str:
         """Insert new letter into database. Expects all fields in letter_data."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO letters (
-                    letter_id, letter_name, creation_datetime, contents, html_contents, postal_info,
-                    received_date, scheduled_delivery_datetime, delivery_datetime, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                letter_data['letter_id'],
-                letter_data['letter_name'],
-                letter_data['creation_datetime'],
-                letter_data['contents'],
-                letter_data['html_contents'],
-                json.dumps(letter_data['postal_info']),
-                letter_data['received_date'],
-                letter_data['scheduled_delivery_datetime'],
-                letter_data.get('delivery_datetime'),  # Can be None at insert
-                letter_data['status']
-            ))
-            conn.commit()
+        with self._lock:
+            try:
+                with self.conn:
+                    self.conn.execute(INSERT_LETTER_SQL, self._letter_params(letter_data))
+            except sqlite3.Error:
+                # A party inserted by the rolled-back transaction must not stay cached.
+                self._party_ids.clear()
+                raise
             return letter_data['letter_id']
 
+    def insert_letters(self, letters_data: list[dict]) -> list[str]:
+        """Insert many letters with a single executemany in one transaction; all or nothing."""
+        with self._lock:
+            try:
+                with self.conn:
+                    self.conn.executemany(INSERT_LETTER_SQL, [self._letter_params(letter) for letter in letters_data])
+            except sqlite3.Error:
+                self._party_ids.clear()
+                raise
+        return [letter['letter_id'] for letter in letters_data]
+
     def get_letter_by_id(self, letter_id: str) -> Optional[dict]:
         """Retrieve letter data by ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("SELECT * FROM letters WHERE letter_id = ?", (letter_id,))
-            row = c.fetchone()
-            if row:
-                return {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "creation_datetime": row[2],
-                    "contents": row[3],
-                    "html_contents": row[4],
-                    "postal_info": json.loads(row[5]),
-                    "received_date": row[6],
-                    "scheduled_delivery_datetime": row[7],
-                    "delivery_datetime": row[8],
-                    "status": row[9],
-                }
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {LETTER_SELECT} FROM letters WHERE letter_id = ?", (letter_id,)
+            ).fetchone()
+        return self._row_to_letter(row) if row else None
+
+    def get_letter_record(self, letter_id: str) -> Optional[LetterRecord]:
+        """Retrieve a lightweight letter handle by ID; body columns load on demand."""
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {LETTER_METADATA_SELECT} FROM letters WHERE letter_id = ?", (letter_id,)
+            ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def get_letter_body(self, letter_id: str) -> Optional[dict]:
+        """Retrieve only the heavy columns of a letter: contents and html_contents."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT contents, html_contents FROM letters WHERE letter_id = ?", (letter_id,)
+            ).fetchone()
+        if not row:
             return None
+        return {"contents": self.codec.decode(row[0]), "html_contents": self.codec.decode(row[1])}
+
+    def get_pending_letter_records(self) -> list[LetterRecord]:
+        """Like get_pending_letters, but returns lightweight handles without the body columns."""
+        now = int(time.time())
+        with self._lock:
+            rows = self.conn.execute(f"""
+                SELECT {LETTER_METADATA_SELECT} FROM letters
+                WHERE status = 'in transit' AND scheduled_delivery_ts <= ?
+                  AND (next_retry_ts IS NULL OR next_retry_ts <= ?)
+            """, (now, now)).fetchall()
+        return [self._row_to_record(row) for row in rows]
 
     def get_pending_letters(self) -> list[dict]:
-        """Get all letters ready for delivery (status = 'in transit' and scheduled_delivery_datetime <= now)."""
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT * FROM letters
-                WHERE status = 'in transit' AND scheduled_delivery_datetime <= ?
-            """, (now,))
-            rows = c.fetchall()
-            return [
-                {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "creation_datetime": row[2],
-                    "contents": row[3],
-                    "html_contents": row[4],
-                    "postal_info": json.loads(row[5]),
-                    "received_date": row[6],
-                    "scheduled_delivery_datetime": row[7],
-                    "delivery_datetime": row[8],
-                    "status": row[9],
-                }
-                for row in rows
-            ]
+        """
+        Get all letters ready for delivery: status 'in transit', scheduled_delivery_ts <= now
+        and not backing off after a failed attempt (next_retry_ts unset or <= now).
+        """
+        now = int(time.time())
+        with self._lock:
+            rows = self.conn.execute(f"""
+                SELECT {LETTER_SELECT} FROM letters
+                WHERE status = 'in transit' AND scheduled_delivery_ts <= ?
+                  AND (next_retry_ts IS NULL OR next_retry_ts <= ?)
+            """, (now, now)).fetchall()
+        return [self._row_to_letter(row) for row in rows]
 
     def update_letter_status(self, letter_id: str, status: str, delivery_datetime: Optional[str] = None) -> bool:
         """Update letter delivery status and (optionally) delivery_datetime."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
+        with self._lock, self.conn:
             if delivery_datetime:
-                c.execute("""
+                c = self.conn.execute("""
                     UPDATE letters
-                    SET status = ?, delivery_datetime = ?
+                    SET status = ?, delivery_datetime = ?, delivery_ts = ?,
+                        lease_owner = NULL, lease_expires_ts = NULL
                     WHERE letter_id = ?
-                """, (status, delivery_datetime, letter_id))
+                """, (status, delivery_datetime, to_epoch(delivery_datetime), letter_id))
             else:
-                c.execute("""
+                c = self.conn.execute("""
                     UPDATE letters
-                    SET status = ?
+                    SET status = ?, lease_owner = NULL, lease_expires_ts = NULL
                     WHERE letter_id = ?
                 """, (status, letter_id))
-            conn.commit()
             return c.rowcount > 0
+
+    def claim_due_letters(self, owner: str, limit: int = 50, lease_seconds: int = 600,
+                          retry_cutoff: Optional[int] = None) -> list[LetterRecord]:
+        """
+        Atomically move up to `limit` due letters from 'in transit' to 'sending',
+        leased to `owner` until now + lease_seconds, so concurrent senders never
+        pick the same letter. Returns every letter currently leased to `owner`;
+        owners should therefore be unique per sender process.
+        Letters held back after a failure are only claimed once their
+        next_retry_ts is at most `retry_cutoff` (default now).
+        """
+        now = int(time.time())
+        retry_cutoff = now if retry_cutoff is None else min(retry_cutoff, now)
+        with self._lock, self.conn:
+            # Take the write lock up front so the claim and the read-back see the same state.
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("""
+                UPDATE letters
+                SET status = 'sending', lease_owner = ?, lease_expires_ts = ?
+                WHERE rowid IN (
+                    SELECT rowid FROM letters
+                    WHERE status = 'in transit' AND scheduled_delivery_ts <= ?
+                      AND (next_retry_ts IS NULL OR next_retry_ts <= ?)
+                    ORDER BY scheduled_delivery_ts
+                    LIMIT ?
+                )
+            """, (owner, now + lease_seconds, now, retry_cutoff, limit))
+            rows = self.conn.execute(f"""
+                SELECT {LETTER_METADATA_SELECT} FROM letters
+                WHERE status = 'sending' AND lease_owner = ?
+                ORDER BY scheduled_delivery_ts
+            """, (owner,)).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def release_letter(self, letter_id: str, owner: str) -> bool:
+        """Return a letter leased to `owner` to 'in transit', e.g. after a failed send."""
+        with self._lock, self.conn:
+            c = self.conn.execute("""
+                UPDATE letters
+                SET status = 'in transit', lease_owner = NULL, lease_expires_ts = NULL
+                WHERE letter_id = ? AND status = 'sending' AND lease_owner = ?
+            """, (letter_id, owner))
+            return c.rowcount > 0
+
+    def record_delivery_failure(self, letter_id: str, error: str, retry_after: Optional[float]) -> Optional[int]:
+        """
+        Record a failed delivery attempt: bump attempt_count, keep the error and
+        hold the letter back for `retry_after` seconds. A leased letter returns
+        to 'in transit'; with retry_after None it is given up on instead and
+        moves to 'failed'. Returns the new attempt count, or None if the letter
+        is missing or no longer pending.
+        """
+        if retry_after is None:
+            status, next_retry_ts = "failed", None
+        else:
+            status, next_retry_ts = "in transit", int(time.time() + retry_after)
+        with self._lock, self.conn:
+            c = self.conn.execute("""
+                UPDATE letters
+                SET status = ?, lease_owner = NULL, lease_expires_ts = NULL,
+                    attempt_count = attempt_count + 1, last_error = ?, next_retry_ts = ?
+                WHERE letter_id = ? AND status IN ('in transit', 'sending')
+            """, (status, error, next_retry_ts, letter_id))
+            if c.rowcount == 0:
+                return None
+            return self.conn.execute("SELECT attempt_count FROM letters WHERE letter_id = ?",
+                                     (letter_id,)).fetchone()[0]
+
+    def reap_expired_leases(self) -> int:
+        """Return letters whose lease expired (e.g. their sender crashed) to 'in transit'. Returns the count."""
+        now = int(time.time())
+        with self._lock, self.conn:
+            c = self.conn.execute("""
+                UPDATE letters
+                SET status = 'in transit', lease_owner = NULL, lease_expires_ts = NULL
+                WHERE status = 'sending' AND lease_expires_ts < ?
+            """, (now,))
+            return c.rowcount
         
+    def add_subjects(self, subjects: list[str]) -> int:
+        """Add subjects to the pool, skipping any already in it (used or not). Returns how many were added."""
+        now = int(time.time())
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO email_subjects (subject, created_ts) VALUES (?, ?)",
+                                  [(subject, now) for subject in subjects])
+            return self.conn.total_changes - before
+
+    def take_subject(self) -> Optional[str]:
+        """Take the oldest unused subject from the pool and mark it used. None when the pool is empty."""
+        with self._lock, self.conn:
+            # Write lock first, so concurrent senders never take the same subject.
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("""
+                SELECT subject_id, subject FROM email_subjects
+                WHERE used_ts IS NULL ORDER BY subject_id LIMIT 1
+            """).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE email_subjects SET used_ts = ? WHERE subject_id = ?",
+                              (int(time.time()), row[0]))
+            return row[1]
+
+    def count_unused_subjects(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM email_subjects WHERE used_ts IS NULL").fetchone()[0]
+
     def get_last_submitted_letter(self) -> Optional[dict]:
         """Retrieve the most recently created letter with status 'in transit'."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT * FROM letters
+        with self._lock:
+            row = self.conn.execute(f"""
+                SELECT {LETTER_SELECT} FROM letters
                 WHERE status = 'in transit'
-                ORDER BY received_date DESC
+                ORDER BY received_ts DESC
                 LIMIT 1
-            """)
-            row = c.fetchone()
-            if row:
-                return {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "creation_datetime": row[2],
-                    "contents": row[3],
-                    "html_contents": row[4],
-                    "postal_info": json.loads(row[5]),
-                    "received_date": row[6],
-                    "scheduled_delivery_datetime": row[7],
-                    "delivery_datetime": row[8],
-                    "status": row[9],
-                }
-            return None
+            """).fetchone()
+        return self._row_to_letter(row) if row else None
         
     def get_next_letter_to_deliver(self) -> Optional[dict]:
         """Retrieve the next letter to be delivered (earliest received_date with status 'in transit')."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT * FROM letters
+        with self._lock:
+            row = self.conn.execute(f"""
+                SELECT {LETTER_SELECT} FROM letters
                 WHERE status = 'in transit'
-                ORDER BY received_date ASC
+                ORDER BY received_ts ASC
                 LIMIT 1
-            """)
-            row = c.fetchone()
-            if row:
-                return {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "creation_datetime": row[2],
-                    "contents": row[3],
-                    "html_contents": row[4],
-                    "postal_info": json.loads(row[5]),
-                    "received_date": row[6],
-                    "scheduled_delivery_datetime": row[7],
-                    "delivery_datetime": row[8],
-                    "status": row[9],
-                }
-            return None
+            """).fetchone()
+        return self._row_to_letter(row) if row else None
     
     def get_all_delivered_letters(self) -> list[dict]:
         """Retrieve all letters with status 'delivered', ordered by creation_datetime ascending."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT * FROM letters
+        with self._lock:
+            rows = self.conn.execute(f"""
+                SELECT {LETTER_SELECT} FROM letters
                 WHERE status = 'delivered'
                 ORDER BY creation_datetime ASC
-            """)
-            rows = c.fetchall()
-            return [
-                {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "creation_datetime": row[2],
-                    "contents": row[3],
-                    "html_contents": row[4],
-                    "postal_info": json.loads(row[5]),
-                    "received_date": row[6],
-                    "scheduled_delivery_datetime": row[7],
-                    "delivery_datetime": row[8],
-                    "status": row[9],
-                }
-                for row in rows
-            ]
+            """).fetchall()
+        return [self._row_to_letter(row) for row in rows]
         
     def getAllLetters(self) -> list[dict]:
         """Retrieve all letters in the database."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("SELECT * FROM letters")
-            rows = c.fetchall()
-            return [
-                {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "creation_datetime": row[2],
-                    "contents": row[3],
-                    "html_contents": row[4],
-                    "postal_info": json.loads(row[5]),
-                    "received_date": row[6],
-                    "scheduled_delivery_datetime": row[7],
-                    "delivery_datetime": row[8],
-                    "status": row[9],
-                }
-                for row in rows
-            ]
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {LETTER_SELECT} FROM letters").fetchall()
+        return [self._row_to_letter(row) for row in rows]
     
+    def get_letters_page(self, after: Optional[str] = None, limit: int = 100) -> list[dict]:
+        """Return up to `limit` letters ordered by letter_id, starting after the letter_id `after`."""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {LETTER_SELECT} FROM letters WHERE letter_id > ? ORDER BY letter_id LIMIT ?",
+                ("" if after is None else after, limit)
+            ).fetchall()
+        return [self._row_to_letter(row) for row in rows]
+
+    def get_delivered_letters_page(self, after: Optional[tuple[str, str]] = None, limit: int = 100) -> list[dict]:
+        """
+        Return up to `limit` delivered letters ordered by creation_datetime.
+        `after` is the (creation_datetime, letter_id) key of the last letter of the previous page.
+        """
+        with self._lock:
+            if after is None:
+                rows = self.conn.execute(f"""
+                    SELECT {LETTER_SELECT} FROM letters
+                    WHERE status = 'delivered'
+                    ORDER BY creation_datetime, letter_id
+                    LIMIT ?
+                """, (limit,)).fetchall()
+            else:
+                rows = self.conn.execute(f"""
+                    SELECT {LETTER_SELECT} FROM letters
+                    WHERE status = 'delivered' AND (creation_datetime, letter_id) > (?, ?)
+                    ORDER BY creation_datetime, letter_id
+                    LIMIT ?
+                """, (*after, limit)).fetchall()
+        return [self._row_to_letter(row) for row in rows]
+
+    def get_letters_summary_page(self, after: Optional[str] = None, limit: int = 100) -> list[dict]:
+        """Summary counterpart of get_letters_page: letter_id, letter_name, scheduled_delivery_datetime, status."""
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT letter_id, letter_name, scheduled_delivery_datetime, status FROM letters
+                WHERE letter_id > ?
+                ORDER BY letter_id
+                LIMIT ?
+            """, ("" if after is None else after, limit)).fetchall()
+        return [
+            {
+                "letter_id": row[0],
+                "letter_name": row[1],
+                "scheduled_delivery_datetime": row[2],
+                "status": row[3]
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _iter_pages(fetch_page: Callable, page_key: Callable, chunk_size: int) -> Iterator[dict]:
+        """
+        Stream rows by walking keyset pages of `chunk_size`. Each chunk is its own
+        short query, so the lock is not held while the caller consumes rows.
+        """
+        after = None
+        while True:
+            page = fetch_page(after=after, limit=chunk_size)
+            yield from page
+            if len(page) < chunk_size:
+                return
+            after = page_key(page[-1])
+
+    def iter_all_letters(self, chunk_size: int = 500) -> Iterator[dict]:
+        """Generator counterpart of getAllLetters with constant memory use."""
+        return self._iter_pages(self.get_letters_page, lambda letter: letter["letter_id"], chunk_size)
+
+    def iter_all_delivered_letters(self, chunk_size: int = 500) -> Iterator[dict]:
+        """Generator counterpart of get_all_delivered_letters with constant memory use."""
+        return self._iter_pages(
+            self.get_delivered_letters_page,
+            lambda letter: (letter["creation_datetime"], letter["letter_id"]),
+            chunk_size
+        )
+
+    def iter_all_letters_summary(self, chunk_size: int = 500) -> Iterator[dict]:
+        """Generator counterpart of get_all_letters_summary with constant memory use."""
+        return self._iter_pages(self.get_letters_summary_page, lambda letter: letter["letter_id"], chunk_size)
+
     def get_all_letters_summary(self) -> list[dict]:
         """Return summary of all letters: letter_id, letter_name, status."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("SELECT letter_id, letter_name, scheduled_delivery_datetime, status FROM letters")
-            rows = c.fetchall()
-            return [
-                {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "scheduled_delivery_datetime": row[2],
-                    "status": row[3]
-                }
-                for row in rows
-            ]
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT letter_id, letter_name, scheduled_delivery_datetime, status FROM letters"
+            ).fetchall()
+        return [
+            {
+                "letter_id": row[0],
+                "letter_name": row[1],
+                "scheduled_delivery_datetime": row[2],
+                "status": row[3]
+            }
+            for row in rows
+        ]
+
+    def recompress_letters(self, chunk_size: int = 500) -> int:
+        """
+        Rewrite stored contents/html_contents with the current codec, e.g. after
+        enabling compression on an existing database. Works in rowid chunks, one
+        transaction each, and only touches rows whose stored form changes.
+        Returns the number of rows rewritten.
+        """
+        rewritten = 0
+        last_rowid = 0
+        while True:
+            with self._lock, self.conn:
+                rows = self.conn.execute("""
+                    SELECT rowid, contents, html_contents FROM letters
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?
+                """, (last_rowid, chunk_size)).fetchall()
+                updates = []
+                for rowid, contents, html_contents in rows:
+                    new_contents = self.codec.encode(self.codec.decode(contents))
+                    new_html_contents = self.codec.encode(self.codec.decode(html_contents))
+                    if new_contents != contents or new_html_contents != html_contents:
+                        updates.append((new_contents, new_html_contents, rowid))
+                self.conn.executemany(
+                    "UPDATE letters SET contents = ?, html_contents = ? WHERE rowid = ?", updates
+                )
+            rewritten += len(updates)
+            if len(rows) < chunk_size:
+                return rewritten
+            last_rowid = rows[-1][0]
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Full-text search over letter names and contents using FTS5 query syntax.
+        Returns lightweight hits, best match first, each with a highlighted snippet.
+        """
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT l.letter_id, l.letter_name, l.status, l.scheduled_delivery_datetime,
+                       snippet(letters_fts, -1, '[', ']', '…', 12), bm25(letters_fts)
+                FROM letters_fts
+                JOIN letters l ON l.rowid = letters_fts.rowid
+                WHERE letters_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (query, limit)).fetchall()
+        return [
+            {
+                "letter_id": row[0],
+                "letter_name": row[1],
+                "status": row[2],
+                "scheduled_delivery_datetime": row[3],
+                "snippet": row[4],
+                "score": row[5]
+            }
+            for row in rows
+        ]
+
+    def rebuild_search_index(self):
+        """
+        Repopulate the full-text index from the letters table. VACUUM may renumber
+        the rowids the index is keyed on, so run this after vacuuming.
+        """
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM letters_fts")
+            self.conn.execute("""
+                INSERT INTO letters_fts (rowid, letter_name, contents)
+                SELECT rowid, letter_name, letter_text(contents) FROM letters
+            """)
 
     def get_pending_letters_summary(self) -> list[dict]:
         """Return summary of all pending letters: letter_id, letter_name, status, scheduled_delivery_datetime."""
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
+        with self._lock:
+            rows = self.conn.execute("""
                 SELECT letter_id, letter_name, status, scheduled_delivery_datetime
                 FROM letters
                 WHERE status = 'in transit'
-            """)
-            rows = c.fetchall()
-            return [
-                {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "status": row[2],
-                    "scheduled_delivery_datetime": row[3]
-                }
-                for row in rows
-            ]
+            """).fetchall()
+        return [
+            {
+                "letter_id": row[0],
+                "letter_name": row[1],
+                "status": row[2],
+                "scheduled_delivery_datetime": row[3]
+            }
+            for row in rows
+        ]
         
     def get_next_letters_2deliver_summary(self) -> list[dict]:
         """Return summary of all pending letters: letter_id, letter_name, status, scheduled_delivery_datetime."""
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
+        now = int(time.time())
+        with self._lock:
+            rows = self.conn.execute("""
                 SELECT letter_id, letter_name, status, scheduled_delivery_datetime
                 FROM letters
-                WHERE status = 'in transit' AND scheduled_delivery_datetime >= ?
-            """, (now,))
-            rows = c.fetchall()
-            return [
-                {
-                    "letter_id": row[0],
-                    "letter_name": row[1],
-                    "status": row[2],
-                    "scheduled_delivery_datetime": row[3]
-                }
-                for row in rows
-            ]
+                WHERE status = 'in transit' AND scheduled_delivery_ts >= ?
+            """, (now,)).fetchall()
+        return [
+            {
+                "letter_id": row[0],
+                "letter_name": row[1],
+                "status": row[2],
+                "scheduled_delivery_datetime": row[3]
+            }
+            for row in rows
+        ]
         
     def delete_letter_by_id(self, letter_id: str) -> bool:
         """Delete a letter from the database by its ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM letters WHERE letter_id = ?", (letter_id,))
-            conn.commit()
+        with self._lock, self.conn:
+            c = self.conn.execute("DELETE FROM letters WHERE letter_id = ?", (letter_id,))
             return c.rowcount > 0
 
     def override_scheduled_delivery(self, letter_id: str, new_datetime: str) -> bool:
@@ -291,36 +921,69 @@ class PostalDatabase:
         Only letters with status 'in transit' can be updated.
         Returns True if the update was successful, False otherwise.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("""
+        with self._lock, self.conn:
+            c = self.conn.execute("""
                 UPDATE letters
-                SET scheduled_delivery_datetime = ?
+                SET scheduled_delivery_datetime = ?, scheduled_delivery_ts = ?
                 WHERE letter_id = ? AND status = 'in transit'
-            """, (new_datetime, letter_id))
-            conn.commit()
+            """, (new_datetime, to_epoch(new_datetime), letter_id))
             return c.rowcount > 0
 
+def codec_from_name(name: Optional[str], template_path: str = None) -> Optional[BlobCodec]:
+    """Build the codec for a configuration name: None/"none", "zlib" or "zdict" (trained on template_path)."""
+    if name in (None, "none"):
+        return None
+    if name == "zdict":
+        template_path = template_path or Path(__file__).resolve().parent.parent / "templates/letter_template.html"
+        return BlobCodec("zdict", zdict=dictionary_from_template(template_path))
+    return BlobCodec(name)
+
+
 if __name__ == "__main__":
-    import sys
     from pprint import pprint
     db_path = "../data/postal.db"
     if len(sys.argv) < 2:
-        print("Usage: python3 postalDatabase.py --getAllLetters|--getAllLettersSummary|--getPendingLettersSummary|--delete letter_ID|--overrideDelivery letter_ID new_datetime [db_path]")
+        print("Usage: python3 postalDatabase.py --getAllLetters|--getAllLettersSummary|--getPendingLettersSummary|--delete letter_ID|--overrideDelivery letter_ID new_datetime|--recompress none|zlib|zdict|--search query [db_path]")
         sys.exit(1)
     method = sys.argv[1]
     # Fix argument parsing here:
     if method in ("--delete", "--overrideDelivery"):
         db_path = sys.argv[4] if len(sys.argv) > 4 else db_path
+    elif method in ("--recompress", "--search"):
+        db_path = sys.argv[3] if len(sys.argv) > 3 else db_path
     else:
         db_path = sys.argv[2] if len(sys.argv) > 2 else db_path
-    pdb = PostalDatabase(db_path)
+    codec = None
+    if method == "--recompress":
+        if len(sys.argv) < 3 or sys.argv[2] not in ("none", "zlib", "zdict"):
+            print("Usage: python3 postalDatabase.py --recompress none|zlib|zdict [db_path]")
+            sys.exit(1)
+        codec = codec_from_name(sys.argv[2])
+    pdb = PostalDatabase(db_path, codec=codec)
     if method == "--getAllLetters":
-        pprint(pdb.getAllLetters())
+        for letter in pdb.iter_all_letters():
+            pprint(letter)
     elif method == "--getAllLettersSummary":
-        pprint(pdb.get_all_letters_summary())
+        for letter in pdb.iter_all_letters_summary():
+            pprint(letter)
     elif method == "--getPendingLettersSummary":
         pprint(pdb.get_pending_letters_summary())
+    elif method == "--search":
+        if len(sys.argv) < 3:
+            print("Usage: python3 postalDatabase.py --search \"query\" [db_path]")
+            sys.exit(1)
+        try:
+            hits = pdb.search(sys.argv[2], limit=20)
+        except sqlite3.OperationalError as e:
+            print(f"Invalid search query: {e}")
+            sys.exit(1)
+        for hit in hits:
+            print(f"{hit['letter_id']}:{hit['letter_name']} [{hit['status']}] {hit['snippet']}")
+        if not hits:
+            print("No letters found.")
+    elif method == "--recompress":
+        rewritten = pdb.recompress_letters()
+        print(f"{rewritten} letters rewritten with codec {sys.argv[2]}.")
     elif method == "--delete":
         if len(sys.argv) < 3:
             print("Usage: python3 postalDatabase.py --delete letter_ID [db_path]")
@@ -340,7 +1003,7 @@ if __name__ == "__main__":
         new_datetime = sys.argv[3]
         try:
             # Validate datetime format
-            datetime.strptime(new_datetime, "%Y-%m-%d %H:%M:%S")
+            datetime.strptime(new_datetime, DATETIME_FORMAT)
         except ValueError:
             print("Invalid datetime format. Use: %Y-%m-%d %H:%M:%S")
             sys.exit(1)
@@ -351,4 +1014,6 @@ if __name__ == "__main__":
             print(f"Letter {letter_id} not found, not in transit, or could not be updated.")
     else:
         print("Unknown method. Use --getAllLetters, --getAllLettersSummary, "
-            "--getPendingLettersSummary, --delete letter_ID, or --overrideDelivery letter_ID new_datetime [db_path].")
\ No newline at end of file
+            "--getPendingLettersSummary, --delete letter_ID, --overrideDelivery letter_ID new_datetime, "
+            "--recompress none|zlib|zdict, or --search query [db_path].")
+    pdb.close()
@@ -2,15 +2,36 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 import json
+import os
 import sys
 import random
+import re
+import socket
+import time
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
 from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional, Union
 
-from modules.postalDatabase import PostalDatabase
-from modules.HTMLRenderer import HTMLRenderer
-from modules.emailSender import EmailSender
+from modules.postalDatabase import PostalDatabase, LetterRecord, DATETIME_FORMAT, codec_from_name, party_key
+from modules.HTMLRenderer import HTMLRenderer, BYTECODE_CACHE_DIR
+from modules.renderCache import RenderCache, content_hash, render_key
+from modules.deliveryTransport import DeliveryTransport, transport_from_config
 from modules.aiTextGenerator import AiTextGenerator
+from modules.rateLimiter import TokenBucket, backoff_delay, call_with_retry, is_retryable
+from modules.stageTimings import StageTimings
+
+
+@dataclass
+class DeliveryResult:
+    letter_id: str
+    letter_name: str
+    success: bool
+    error: Optional[str] = None
+
 
 class PyPost:
     def __init__(self,
@@ -21,67 +42,153 @@ class PyPost:
                  token_folder_path: str = PROJECT_ROOT / "Secrets",
                  postal_info_path: str = PROJECT_ROOT / "data/postal_info.json",
                  api_key_path: str = PROJECT_ROOT / "Secrets/openApi_key.json",
-                 email_subject_prompt_template: str = PROJECT_ROOT / "templates/email_subject_prompt_template.txt"):
+                 email_subject_prompt_template: str = PROJECT_ROOT / "templates/email_subject_prompt_template.txt",
+                 email_subject_pool_prompt_template: str = PROJECT_ROOT / "templates/email_subject_pool_prompt_template.txt",
+                 compression: str = None,
+                 discovery_cache_dir: str = PROJECT_ROOT / "data/discovery_cache",
+                 transport_config_path: str = PROJECT_ROOT / "data/transport.json",
+                 send_rate: float = 2.0,
+                 ai_rate: float = 5.0,
+                 send_attempts: int = 3,
+                 retry_base_delay: float = 60,
+                 retry_max_delay: float = 6 * 3600,
+                 max_delivery_attempts: int = 8,
+                 subject_timeout: float = 5,
+                 subject_pool_min: int = 20,
+                 template_cache_dir: str = BYTECODE_CACHE_DIR,
+                 template_auto_reload: bool = False,
+                 template_reload_interval: float = 2.0,
+                 defer_rendering: bool = False,
+                 render_cache_dir: str = PROJECT_ROOT / "data/render_cache",
+                 render_cache_size: int = 128,
+                 render_cache_disk_bytes: int = 64 * 1024 * 1024,
+                 stream_min_size: int = 1024 * 1024):
         self.db_path = db_path
-        self.db = PostalDatabase(db_path)
-        self.letter_renderer = HTMLRenderer(letter_template_path)
-        self.email_body_renderer = HTMLRenderer(email_body_template_path)
-        self.email_sender = EmailSender(
-            client_secret_file,
-            token_folder_path,
-            "gmail",
-            "v1",
-            "https://mail.google.com/"
+        # compression: None, "zlib" or "zdict" (dictionary trained on the letter template)
+        self.db = PostalDatabase(db_path, codec=codec_from_name(compression, letter_template_path))
+        self.letter_template_path = letter_template_path
+        self.email_body_template_path = email_body_template_path
+        self.client_secret_file = client_secret_file
+        self.token_folder_path = token_folder_path
+        self.discovery_cache_dir = discovery_cache_dir
+        # Selects Gmail, SMTP or a local Maildir/mbox sink; Gmail when the file is absent.
+        self.transport_config_path = transport_config_path
+        self.postal_info_path = postal_info_path
+        self.api_key_path = api_key_path
+        self.email_subject_prompt_template = email_subject_prompt_template
+        self.email_subject_pool_prompt_template = email_subject_pool_prompt_template
+        # Compiled template bytecode (None: compile in memory only).
+        self.template_cache_dir = template_cache_dir
+        # Resident senders can pick up template edits without restarting.
+        self.template_auto_reload = template_auto_reload
+        self.template_reload_interval = template_reload_interval
+        # With defer_rendering, letters are stored without their HTML and
+        # rendered at send time with the current template (see letter_html),
+        # through a cache shared by previews, sends and resends.
+        self.defer_rendering = defer_rendering
+        self.render_cache_dir = render_cache_dir
+        self.render_cache_size = render_cache_size
+        self.render_cache_disk_bytes = render_cache_disk_bytes
+        # Uncached deferred letters longer than this (in characters) are streamed
+        # into the attachment; anything shorter is attached whole, which Gmail
+        # sends in one request instead of a resumable upload.
+        self.stream_min_size = stream_min_size
+        self.deault_email_subject = "💌 Una carta te espera"
+        # Calls per second allowed to the transport and the AI API, shared by
+        # all worker threads (None disables a limit). Gmail's default quota
+        # allows roughly 2.5 sends per second.
+        self.send_limiter = TokenBucket(send_rate) if send_rate else None
+        self.ai_limiter = TokenBucket(ai_rate) if ai_rate else None
+        # Tries per send within a run; after that the letter is held back for
+        # a jittered exponential delay between retry_base_delay and retry_max_delay.
+        self.send_attempts = send_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Letters are marked 'failed' after this many failed runs, or at once
+        # when the error is not transient (see is_retryable).
+        self.max_delivery_attempts = max_delivery_attempts
+        # Subjects come from a pre-generated pool (see refill_subjects). Only
+        # when it is empty is one generated at send time, with this hard timeout.
+        self.subject_timeout = subject_timeout
+        self.subject_pool_min = subject_pool_min
+        # Per-stage durations (subject, render, send, mark) of deliveries.
+        self.timings = StageTimings()
+
+    # Components below are built on first use, so commands that only touch
+    # the database (e.g. --submit) never load the Gmail or OpenAI clients.
+    # Each can also be assigned directly to swap in another implementation.
+
+    @cached_property
+    def letter_renderer(self) -> HTMLRenderer:
+        return HTMLRenderer(self.letter_template_path, self.template_cache_dir,
+                            auto_reload=self.template_auto_reload, reload_interval=self.template_reload_interval)
+
+    @cached_property
+    def email_body_renderer(self) -> HTMLRenderer:
+        return HTMLRenderer(self.email_body_template_path, self.template_cache_dir,
+                            auto_reload=self.template_auto_reload, reload_interval=self.template_reload_interval)
+
+    @cached_property
+    def render_cache(self) -> RenderCache:
+        return RenderCache(self.render_cache_dir, max_entries=self.render_cache_size,
+                           max_disk_bytes=self.render_cache_disk_bytes)
+
+    @cached_property
+    def email_sender(self) -> DeliveryTransport:
+        return transport_from_config(
+            self.transport_config_path,
+            client_secret_file=self.client_secret_file,
+            token_folder_path=self.token_folder_path,
+            discovery_cache_dir=self.discovery_cache_dir
         )
-        api_key_path = Path(api_key_path)
-        with open(api_key_path, "r", encoding="utf-8") as f:
+
+    @cached_property
+    def ai_text_generator(self) -> AiTextGenerator:
+        with open(Path(self.api_key_path), "r", encoding="utf-8") as f:
             api_data = json.load(f)
             api_key = api_data["api_key"]
-        self.postal_info_path = postal_info_path
-        self.ai_text_generator = AiTextGenerator(api_key=api_key)
-        with open(email_subject_prompt_template, "r", encoding="utf-8") as f:
-            self.email_subject_prompt = f.read()
-        self.deault_email_subject = "💌 Una carta te espera"
+        return AiTextGenerator(api_key=api_key)
+
+    @cached_property
+    def email_subject_prompt(self) -> str:
+        with open(self.email_subject_prompt_template, "r", encoding="utf-8") as f:
+            return f.read()
+
+    @cached_property
+    def email_subject_pool_prompt(self) -> str:
+        with open(self.email_subject_pool_prompt_template, "r", encoding="utf-8") as f:
+            return f.read()
 
     def load_postal_data(self) -> dict:
         with open(self.postal_info_path, "r", encoding="utf-8") as f:
             return json.load(f)
 
-    def calculate_delivery_datetime(self, previous_schedule_datetime_iso: str = None) -> str:
-        now = datetime.now()
+    def calculate_delivery_datetime(self, previous_scheduled_ts: int = None) -> datetime:
+        now = datetime.now().replace(microsecond=0)
         base_dt = now
-        if previous_schedule_datetime_iso:
-            try:
-                prev_dt = datetime.fromisoformat(previous_schedule_datetime_iso)
-                if prev_dt > now:
-                    base_dt = prev_dt
-            except Exception:
-                pass
+        if previous_scheduled_ts:
+            prev_dt = datetime.fromtimestamp(previous_scheduled_ts)
+            if prev_dt > now:
+                base_dt = prev_dt
         min_seconds = 3600 * 24 * 1  # 1 day
         max_seconds = 3600 * 24 * 3  # 3 days
         skew = random.betavariate(2, 5)
         offset_seconds = int(min_seconds + skew * (max_seconds - min_seconds))
-        scheduled_dt = base_dt + timedelta(seconds=offset_seconds)
-        return scheduled_dt.strftime("%Y-%m-%d %H:%M:%S")
+        return base_dt + timedelta(seconds=offset_seconds)
+
+    def address_context(self, sender: dict, recipient: dict) -> dict:
+        """The sender/recipient part of the letter template context, shared by every letter of a postal_info."""
+        context = {}
+        for role, info in (("sender", sender), ("recipient", recipient)):
+            for field in ("name", "address_line1", "address_line2", "zip", "city_state", "country", "phone"):
+                context[f"{role}_{field}"] = info.get(field, "")
+        return context
 
     def render_letter_template(self, letter_content: str, sender: dict, recipient: dict, letter_name: str) -> str:
         context = {
             "letter_name": letter_name,
             "letter_contents": letter_content,
-            "sender_name": sender.get("name", ""),
-            "sender_address_line1": sender.get("address_line1", ""),
-            "sender_address_line2": sender.get("address_line2", ""),
-            "sender_zip": sender.get("zip", ""),
-            "sender_city_state": sender.get("city_state", ""),
-            "sender_country": sender.get("country", ""),
-            "sender_phone": sender.get("phone", ""),
-            "recipient_name": recipient.get("name", ""),
-            "recipient_address_line1": recipient.get("address_line1", ""),
-            "recipient_address_line2": recipient.get("address_line2", ""),
-            "recipient_zip": recipient.get("zip", ""),
-            "recipient_city_state": recipient.get("city_state", ""),
-            "recipient_country": recipient.get("country", ""),
-            "recipient_phone": recipient.get("phone", "")
+            **self.address_context(sender, recipient)
         }
         return self.letter_renderer.render(context)
 
@@ -91,91 +198,335 @@ class PyPost:
             "created_date": letter["creation_datetime"],
             "received_date": letter["received_date"],
             "scheduled_delivery": letter["scheduled_delivery_datetime"],
-            "sent_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "sent_date": datetime.now().strftime(DATETIME_FORMAT)
         }
         return self.email_body_renderer.render(context)
 
-    def submit_letter(self, letter_file_path: str) -> str:
-        postal_data = self.load_postal_data()
+    def _render_key(self, letter) -> str:
+        return render_key(self.letter_renderer.source_hash,
+                          content_hash(letter["letter_name"], letter["contents"]),
+                          party_key(letter["postal_info"])[1])
+
+    def letter_html(self, letter) -> str:
+        """
+        The HTML attached for a letter: its stored html_contents or, for deferred
+        letters, a render with the current template through render_cache.
+        """
+        if letter["template_hash"] is None:
+            return letter["html_contents"]
+        postal_info = letter["postal_info"]
+        return self.render_cache.get_or_render(self._render_key(letter), lambda: self.render_letter_template(
+            letter["contents"], postal_info["sender"], postal_info["recipient"], letter["letter_name"]))
+
+    def letter_attachment_data(self, letter) -> Union[str, Callable[[], Iterable[str]]]:
+        """
+        letter_html, or for a long uncached deferred letter a factory of HTML chunks called
+        once per send attempt, rendered piece by piece and cached once fully read.
+        """
+        if letter["template_hash"] is None or len(letter["contents"]) <= self.stream_min_size:
+            return self.letter_html(letter)
+        html = self.render_cache.get(self._render_key(letter))
+        if html is not None:
+            return html
+        postal_info = letter["postal_info"]
+        context = {"letter_name": letter["letter_name"], "letter_contents": letter["contents"],
+                   **self.address_context(postal_info["sender"], postal_info["recipient"])}
+
+        def stream():
+            key = self._render_key(letter)
+            cached = self.render_cache.get(key)
+            if cached is not None:  # an earlier attempt read the stream to the end
+                yield cached
+                return
+            chunks = []
+            for chunk in self.letter_renderer.iter_render(context):
+                chunks.append(chunk)
+                yield chunk
+            self.render_cache.put(key, "".join(chunks))
+        return stream
+
+    def preview_letter(self, letter_id: str) -> Optional[str]:
+        """The HTML a letter would be sent with, or None if there is no such letter."""
+        letter = self.db.get_letter_record(letter_id)
+        return self.letter_html(letter) if letter else None
+
+    def build_letter_data(self, letter_file_path: str, postal_data: dict, prev_scheduled_ts: int = None,
+                          render: bool = True) -> dict:
+        """
+        Read one letter file into the row dict expected by PostalDatabase.insert_letter.
+        html_contents is None with render=False, and empty (template_hash set) with defer_rendering.
+        """
         sender = postal_data["sender"]
         recipient = postal_data["recipient"]
 
         with open(letter_file_path, "r", encoding="utf-8") as f:
             letter_content = f.read()
 
-        now_iso = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        last_letter = self.db.get_last_submitted_letter()
-        prev_scheduled_datetime = last_letter["scheduled_delivery_datetime"] if last_letter else None
-        scheduled_delivery = self.calculate_delivery_datetime(prev_scheduled_datetime)
+        now = datetime.now().replace(microsecond=0)
+        scheduled_delivery = self.calculate_delivery_datetime(prev_scheduled_ts)
 
         letter_name = Path(letter_file_path).stem
-        html_contents = self.render_letter_template(letter_content, sender, recipient, letter_name)
+        html_contents = None
+        template_hash = None
+        if self.defer_rendering:
+            html_contents, template_hash = "", self.letter_renderer.source_hash
+        elif render:
+            html_contents = self.render_letter_template(letter_content, sender, recipient, letter_name)
 
-        letter_data = {
+        return {
             "letter_id": str(uuid.uuid4()),
             "letter_name": letter_name,
             "creation_datetime": letter_name, # Using letter_name as creation date
             "contents": letter_content,
             "html_contents": html_contents,
             "postal_info": postal_data,
-            "received_date": now_iso,
-            "scheduled_delivery_datetime": scheduled_delivery,
+            "received_date": now.strftime(DATETIME_FORMAT),
+            "scheduled_delivery_datetime": scheduled_delivery.strftime(DATETIME_FORMAT),
             "delivery_datetime": None,
-            "status": "in transit"
+            "status": "in transit",
+            "received_ts": int(now.timestamp()),
+            "scheduled_delivery_ts": int(scheduled_delivery.timestamp()),
+            "template_hash": template_hash
         }
+
+    def submit_letter(self, letter_file_path: str) -> str:
+        postal_data = self.load_postal_data()
+        last_letter = self.db.get_last_submitted_letter()
+        prev_scheduled_ts = last_letter["scheduled_delivery_ts"] if last_letter else None
+        letter_data = self.build_letter_data(letter_file_path, postal_data, prev_scheduled_ts)
         self.db.insert_letter(letter_data)
         return letter_data["letter_id"]
 
+    def submit_letters(self, letter_file_paths: list) -> list[str]:
+        """
+        Submit many letter files with one postal_info read and one insert transaction,
+        chaining their schedules in memory and rendering them together (render_many).
+        """
+        if not letter_file_paths:
+            return []
+        postal_data = self.load_postal_data()
+        last_letter = self.db.get_last_submitted_letter()
+        prev_scheduled_ts = last_letter["scheduled_delivery_ts"] if last_letter else None
+        letters_data = []
+        for letter_file_path in letter_file_paths:
+            letter_data = self.build_letter_data(letter_file_path, postal_data, prev_scheduled_ts, render=False)
+            prev_scheduled_ts = letter_data["scheduled_delivery_ts"]
+            letters_data.append(letter_data)
+        if not self.defer_rendering:
+            address = self.address_context(postal_data["sender"], postal_data["recipient"])
+            contexts = [{"letter_name": letter_data["letter_name"], "letter_contents": letter_data["contents"]}
+                        for letter_data in letters_data]
+            for letter_data, html_contents in zip(letters_data, self.letter_renderer.render_many(contexts, address)):
+                letter_data["html_contents"] = html_contents
+        return self.db.insert_letters(letters_data)
+
     def send_email(self, letter_id: str) -> bool:
-        letter = self.db.get_letter_by_id(letter_id)
+        letter = self.db.get_letter_record(letter_id)
         if not letter:
             print(f"Letter ID {letter_id} not found.")
             return False
+        return self.send_letter(letter)
 
-        recipient_email = letter["postal_info"]["recipient"]["email"]
-        letter_name = letter["letter_name"]
-        
-        # Generate email subject with AI, fallback to default if fails
+    def send_letter(self, letter: LetterRecord) -> bool:
+        return self.deliver_letter(letter).success
+
+    def refill_subjects(self, target: int = 100, batch_size: int = 50, max_requests: int = 10,
+                        attempts: int = 3, timeout: float = None) -> int:
+        """Top the subject pool up to `target` unused subjects, `batch_size` per AI request. Returns how many were added."""
+        added = 0
+        for _ in range(max_requests):
+            missing = target - self.db.count_unused_subjects()
+            if missing <= 0:
+                break
+            prompt = self.email_subject_pool_prompt.replace("{count}", str(min(batch_size, missing)))
+            text = call_with_retry(self.ai_text_generator.generate, prompt, attempts=attempts,
+                                   limiter=self.ai_limiter, timeout=timeout)
+            # Drop list markers ("1.", "-", quotes) in case the model adds them anyway.
+            subjects = [re.sub(r'^\s*(?:[-*•]|\d+[.)])?\s*["“]?(.*?)["”]?\s*$', r"\1", line)
+                        for line in text.splitlines()]
+            new = self.db.add_subjects([subject for subject in subjects if subject])
+            if new == 0:
+                break
+            added += new
+        return added
+
+    def next_subject(self) -> str:
+        """A fresh subject from the pool; if it is empty, one generated now (bounded by subject_timeout), else the default."""
+        subject = self.db.take_subject()
+        if subject:
+            return subject
         try:
-            subject = self.ai_text_generator.generate(self.email_subject_prompt)
+            return call_with_retry(self.ai_text_generator.generate, self.email_subject_prompt,
+                                   attempts=1, limiter=self.ai_limiter, timeout=self.subject_timeout)
         except Exception as e:
             print(f"AI subject generation failed: {e}")
-            subject = self.deault_email_subject
-        
-        body_html = self.render_email_body(letter)
+            return self.deault_email_subject
 
-        # Save the HTML letter to a temp file for attachment
-        temp_dir = PROJECT_ROOT / "temp"
-        temp_dir.mkdir(exist_ok=True)
-        temp_html_path = temp_dir / f"{letter_name}.html"
-        with open(temp_html_path, "w", encoding="utf-8") as f:
-            f.write(letter["html_contents"])
+    def prepare_email(self, letter: LetterRecord) -> dict:
+        """Build the EmailSender.send_email arguments for a letter, with the letter HTML as an attachment."""
+        recipient_email = letter["postal_info"]["recipient"]["email"]
 
-        try:
-            self.email_sender.send_email(
-                to=recipient_email,
-                subject=subject,
-                body=body_html,
-                body_type='html',
-                attachment_paths=[temp_html_path],
-                bcc="hardcoded@gmail.com"
+        with self.timings.measure("subject"):
+            subject = self.next_subject()
+
+        with self.timings.measure("render"):
+            body_html = self.render_email_body(letter)
+            attachment = (
+                f"{letter['letter_name']}.html",
+                self.letter_attachment_data(letter),
+                "application/octet-stream"
             )
-            # Update letter status and delivery_datetime
-            self.db.update_letter_status(letter_id, "delivered", delivery_datetime=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            print(f"Letter {letter_id}:{letter_name} sent to {recipient_email}.")
-            return True
+
+        return {
+            "to": recipient_email,
+            "subject": subject,
+            "body": body_html,
+            "body_type": 'html',
+            "attachments": [attachment],
+            "bcc": "hardcoded@gmail.com"
+        }
+
+    def _mark_delivered(self, letter: LetterRecord, recipient_email: str) -> DeliveryResult:
+        # Update letter status and delivery_datetime
+        print(f"Letter {letter['letter_id']}:{letter['letter_name']} sent to {recipient_email}.")
+        try:
+            with self.timings.measure("mark"):
+                self.db.update_letter_status(letter["letter_id"], "delivered", delivery_datetime=datetime.now().strftime(DATETIME_FORMAT))
         except Exception as e:
-            print(f"Failed to send letter {letter_id}: {e}")
-            return False
+            # The letter has left; recording it as a send failure would have it sent again.
+            print(f"Could not mark letter {letter['letter_id']} delivered: {e}")
+        return DeliveryResult(letter["letter_id"], letter["letter_name"], True)
+
+    def _failed(self, letter: LetterRecord, error: Exception) -> DeliveryResult:
+        print(f"Failed to send letter {letter['letter_id']}: {error}")
+        # Persist the failure so later runs back off instead of re-failing right away.
+        attempt = letter["attempt_count"] + 1
+        retry_after = None
+        if is_retryable(error) and attempt < self.max_delivery_attempts:
+            retry_after = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+        try:
+            self.db.record_delivery_failure(letter["letter_id"], f"{type(error).__name__}: {error}", retry_after)
+        except Exception as e:
+            print(f"Could not record failure of letter {letter['letter_id']}: {e}")
+        return DeliveryResult(letter["letter_id"], letter["letter_name"], False, str(error))
+
+    def _send(self, message: dict):
+        with self.timings.measure("send"):
+            return call_with_retry(self.email_sender.send_email, attempts=self.send_attempts,
+                                   limiter=self.send_limiter, **message)
+
+    def deliver_letter(self, letter: LetterRecord) -> DeliveryResult:
+        """Send one letter and mark it delivered. Never raises; failures are reported in the result."""
+        try:
+            message = self.prepare_email(letter)
+            self._send(message)
+        except Exception as e:
+            return self._failed(letter, e)
+        return self._mark_delivered(letter, message["to"])
+
+    def deliver_letters_pipelined(self, letters: list[LetterRecord], lookahead: int = 1) -> list[DeliveryResult]:
+        """Deliver letters in order while the next `lookahead` ones are prepared in the background."""
+        results = []
+        upcoming = iter(letters)
+        prepared = deque()
+        with ThreadPoolExecutor(max_workers=lookahead) as executor:
+            for letter in upcoming:
+                prepared.append((letter, executor.submit(self.prepare_email, letter)))
+                if len(prepared) > lookahead:
+                    results.append(self._deliver_prepared(*prepared.popleft()))
+            while prepared:
+                results.append(self._deliver_prepared(*prepared.popleft()))
+        return results
+
+    def _deliver_prepared(self, letter: LetterRecord, prepared_message) -> DeliveryResult:
+        try:
+            message = prepared_message.result()
+            self._send(message)
+        except Exception as e:
+            return self._failed(letter, e)
+        return self._mark_delivered(letter, message["to"])
+
+    def deliver_letters_batch(self, letters: list[LetterRecord]) -> list[DeliveryResult]:
+        """Like deliver_letter for many letters, sent through the transport's send_batch."""
+        results = {}
+        prepared = []
+        for letter in letters:
+            try:
+                prepared.append((letter, self.prepare_email(letter)))
+            except Exception as e:
+                results[letter["letter_id"]] = self._failed(letter, e)
+        try:
+            if self.send_limiter and prepared:
+                self.send_limiter.acquire(len(prepared))
+            with self.timings.measure("send"):
+                outcomes = self.email_sender.send_batch([message for _, message in prepared])
+        except Exception as e:
+            outcomes = [{"response": None, "error": e}] * len(prepared)
+        for (letter, message), outcome in zip(prepared, outcomes):
+            if outcome["error"] is None:
+                results[letter["letter_id"]] = self._mark_delivered(letter, message["to"])
+            else:
+                results[letter["letter_id"]] = self._failed(letter, outcome["error"])
+        return [results[letter["letter_id"]] for letter in letters]
+
+    def deliver_pending_letters(self, claim_size: int = 50, workers: int = 1,
+                                use_batch: bool = False, lookahead: int = 0) -> list[DeliveryResult]:
+        """
+        Deliver every due letter in leased batches (serially, with `workers` threads,
+        through send_batch, or prefetching `lookahead` letters) and return one DeliveryResult each.
+        """
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Letters failed during this run get a next_retry_ts of at least the run's
+        # start second, even with a zero backoff; only earlier ones are retried.
+        retry_cutoff = int(time.time()) - 1
+        self.db.reap_expired_leases()
+        if self.db.count_unused_subjects() < self.subject_pool_min:
+            # One bulk request up front instead of one per letter; best effort, and
+            # bounded like a single subject so a slow AI API can't hold up the sends.
+            # Larger refills are left to --refill-subjects.
+            try:
+                self.refill_subjects(max_requests=1, attempts=1, timeout=self.subject_timeout)
+            except Exception as e:
+                print(f"Subject pool refill failed: {e}")
+        results = []
+        failed_ids = set()
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 and not use_batch else None
+        if executor or lookahead > 0:
+            # Build the shared components up front rather than racing the workers to it.
+            self.email_sender
+            self.email_body_renderer
+            if self.defer_rendering:
+                self.letter_renderer
+                self.render_cache
+        try:
+            while True:
+                claimed = [letter for letter in self.db.claim_due_letters(owner, limit=max(claim_size, workers),
+                                                                             retry_cutoff=retry_cutoff)
+                           if letter["letter_id"] not in failed_ids]
+                if not claimed:
+                    break
+                if use_batch:
+                    batch_results = self.deliver_letters_batch(claimed)
+                elif executor:
+                    batch_results = list(executor.map(self.deliver_letter, claimed))
+                elif lookahead > 0:
+                    batch_results = self.deliver_letters_pipelined(claimed, lookahead)
+                else:
+                    batch_results = [self.deliver_letter(letter) for letter in claimed]
+                results.extend(batch_results)
+                failed_ids.update(result.letter_id for result in batch_results if not result.success)
         finally:
-            # Clean up temp file
-            Path(temp_html_path).unlink(missing_ok=True)
-
-    def send_pending_letters(self) -> list:
-        pending_letters = self.db.get_pending_letters()
-        sent_ids = []
-        for letter in pending_letters:
-            if self.send_email(letter["letter_id"]):
-                sent_ids.append(letter["letter_id"] + ": " + letter["letter_name"])
-        return sent_ids
-    
\ No newline at end of file
+            if executor:
+                executor.shutdown()
+            for letter_id in failed_ids:
+                self.db.release_letter(letter_id, owner)
+            # Only close a transport this run actually used (e.g. the pooled SMTP connection).
+            transport = self.__dict__.get("email_sender")
+            if isinstance(transport, DeliveryTransport):
+                transport.close()
+        return results
+
+    def send_pending_letters(self, claim_size: int = 50, workers: int = 1, use_batch: bool = False,
+                             lookahead: int = 0) -> list:
+        results = self.deliver_pending_letters(claim_size, workers, use_batch, lookahead)
+        return [result.letter_id + ": " + result.letter_name for result in results if result.success]
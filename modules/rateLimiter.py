@@ -0,0 +1,100 @@
+import random
+import smtplib
+import threading
+import time
+from typing import Callable
+
+# HTTP statuses worth retrying: timeouts, throttling and transient server errors.
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    acquire() reserves its tokens immediately and then sleeps off any deficit,
+    so concurrent callers queue up in arrival order instead of polling.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take `tokens`, blocking until they are available. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0, rng: random.Random = random) -> float:
+    """
+    Jittered exponential backoff for the given 1-based attempt: a random delay
+    between half and all of min(cap, base * 2**(attempt - 1)), so retries from
+    many letters spread out but never come back almost immediately.
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def _status_code(error: Exception):
+    status = getattr(error, "status_code", None)             # openai.APIStatusError
+    if status is None and getattr(error, "resp", None) is not None:
+        status = getattr(error.resp, "status", None)         # googleapiclient HttpError
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether an error from Gmail, OpenAI or SMTP is likely transient (throttling,
+    timeouts, dropped connections, 5xx). Checked by attribute and class name so
+    the client SDKs never need to be imported here.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, smtplib.SMTPServerDisconnected)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if any(cls.__name__ in ("APIConnectionError", "APITimeoutError") for cls in type(error).__mro__):
+        return True
+    status = _status_code(error)
+    if status in RETRYABLE_STATUSES:
+        return True
+    # Gmail reports per-user quota exhaustion as 403 rateLimitExceeded/userRateLimitExceeded.
+    return status == 403 and "ratelimitexceeded" in str(error).lower()
+
+
+def call_with_retry(func: Callable, *args,
+                    attempts: int = 3,
+                    base_delay: float = 1.0,
+                    max_delay: float = 30.0,
+                    limiter: TokenBucket = None,
+                    retryable: Callable[[Exception], bool] = is_retryable,
+                    **kwargs):
+    """
+    Call func(*args, **kwargs), taking a token from `limiter` before every try
+    and retrying retryable errors up to `attempts` tries in total, sleeping
+    backoff_delay between them. The last error, or any non-retryable one, is raised.
+    """
+    for attempt in range(1, attempts + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts or not retryable(e):
+                raise
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
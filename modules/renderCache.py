@@ -0,0 +1,151 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+
+def render_key(template_hash: str, content_hash: str, postal_info_hash: str) -> str:
+    """Cache key of a rendering: everything the rendered letter depends on, hashed together."""
+    return hashlib.sha256(f"{template_hash}:{content_hash}:{postal_info_hash}".encode("ascii")).hexdigest()
+
+
+def content_hash(letter_name: str, contents: str) -> str:
+    """sha256 (hex) of what a letter contributes to its rendering: its name and its text."""
+    return hashlib.sha256(f"{letter_name}\x00{contents}".encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered letters, keyed by render_key.
+
+    An in-memory LRU of up to `max_entries` renderings sits in front of an
+    optional directory holding one file per key, so renderings survive
+    restarts and are shared by every process using the directory. The
+    directory is kept under `max_disk_bytes` by deleting the least recently
+    used files. Keys name their inputs, so entries never go stale: a template
+    edit simply leads to new keys.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 128,
+                 max_disk_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        # Bytes in cache_dir, counted on the first write and kept up to date by
+        # this process; prune() recounts, which also takes other writers into account.
+        self._disk_bytes: Optional[int] = None
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.html"
+
+    def _remember(self, key: str, html: str):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached rendering for `key`, from memory or disk; None on a miss."""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                html = path.read_text(encoding="utf-8")
+                os.utime(path)  # the mtime orders files for pruning
+            except OSError:
+                html = None
+            if html is not None:
+                self._remember(key, html)
+                with self._lock:
+                    self.disk_hits += 1
+                return html
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, html: str):
+        self._remember(key, html)
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        except OSError:
+            return  # Read-only checkout: keep the in-memory copy only.
+        data = html.encode("utf-8")
+        try:
+            # Write then rename, so a concurrent reader never sees a partial file.
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            Path(tmp_path).unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += len(data)
+            over_cap = self._disk_bytes > self.max_disk_bytes
+        if over_cap:
+            # Prune below the cap, so the directory isn't rescanned on every write.
+            self.prune(self.max_disk_bytes * 9 // 10)
+
+    def _disk_files(self) -> list[tuple[float, int, Path]]:
+        files = []
+        for path in self.cache_dir.glob("*/*.html"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # removed by another process meanwhile
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Delete the least recently used files until the disk tier fits in `max_bytes`. Returns how many were deleted."""
+        if self.cache_dir is None:
+            return 0
+        max_bytes = self.max_disk_bytes if max_bytes is None else max_bytes
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self._disk_bytes = total
+        return removed
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> str:
+        """The cached rendering for `key`, or render() stored under it."""
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.put(key, html)
+        return html
+
+    def clear(self):
+        """Forget every rendering, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob("*/*.html"):
+                path.unlink(missing_ok=True)
+            self._disk_bytes = 0
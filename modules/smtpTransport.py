@@ -0,0 +1,82 @@
+import smtplib
+import ssl
+import threading
+
+from modules.deliveryTransport import DeliveryTransport, build_mime_message
+
+
+class SmtpTransport(DeliveryTransport):
+    """
+    Send letters through an SMTP server over one authenticated connection.
+
+    The connection is opened on the first send and reused for every message
+    until close(), so a whole delivery run pays for the TCP, TLS and AUTH
+    handshakes once. Sends are serialised on that connection; a dropped
+    connection is reopened once before the error is raised.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int = 587,
+                 username: str = None,
+                 password: str = None,
+                 sender: str = None,
+                 security: str = "starttls",
+                 timeout: float = 30):
+        """
+        Args:
+            sender: From address; defaults to username.
+            security: "starttls", "ssl" (implicit TLS, usually port 465) or "none".
+        """
+        if security not in ("starttls", "ssl", "none"):
+            raise ValueError("security must be 'starttls', 'ssl' or 'none'")
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.security = security
+        self.timeout = timeout
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                          context=ssl.create_default_context())
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                connection.starttls(context=ssl.create_default_context())
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def send_email(self,
+                   to: str,
+                   subject: str,
+                   body: str,
+                   body_type: str='plain',
+                   attachment_paths: list[str]=None,
+                   bcc: str=None,
+                   attachments: list[tuple[str, bytes, str]]=None):
+        message = build_mime_message(to, subject, body, body_type, attachment_paths, bcc, attachments,
+                                     sender=self.sender)
+        # send_message reads the Bcc header for the envelope and strips it from the message.
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                return self._connection.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._connection = self._connect()
+                return self._connection.send_message(message)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                try:
+                    self._connection.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._connection = None
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list; 0.0 when empty."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+class StageTimings:
+    """
+    Thread-safe collector of per-stage durations (subject, render, send, ...).
+
+    Stages overlap when the pipeline prefetches, so comparing the summed stage
+    time with the run's wall time shows how much waiting was hidden.
+    """
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self) -> dict:
+        """Per stage: count, total seconds and mean/p50/p99 in milliseconds."""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "total_s": sum(values),
+                "mean_ms": 1000 * sum(values) / len(values),
+                "p50_ms": 1000 * percentile(values, 0.50),
+                "p99_ms": 1000 * percentile(values, 0.99),
+            }
+            for stage, values in samples.items()
+        }
+
+    def report(self, wall_seconds: float = None) -> str:
+        lines = [f"{'stage':<10}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}"]
+        summary = self.summary()
+        for stage, stats in summary.items():
+            lines.append(f"{stage:<10}{stats['count']:>8}{stats['total_s']:>10.2f}"
+                         f"{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        if wall_seconds is not None:
+            busy = sum(stats["total_s"] for stats in summary.values())
+            lines.append(f"wall {wall_seconds:.2f} s for {busy:.2f} s of stage time "
+                         f"({max(0.0, busy - wall_seconds):.2f} s overlapped)")
+        return "\n".join(lines)
@@ -1,4 +1,6 @@
+import argparse
 import sys
+import time
 from pathlib import Path
 from modules.pypost import PyPost
 
@@ -7,7 +9,10 @@ def main():
 	if len(sys.argv) < 2:
 		print("Usage:")
 		print("  python3 run_pypost.py --submit letter_name (without .txt)")
-		print("  python3 run_pypost.py --send_pending_letters")
+		print("  python3 run_pypost.py --submit-all [letters_directory]")
+		print("  python3 run_pypost.py --send_pending_letters [--workers N | --batch | --prefetch K]")
+		print("  python3 run_pypost.py --refill-subjects [pool_size]")
+		print("  python3 run_pypost.py --preview letter_id [output.html]")
 		sys.exit(1)
 
 	flag = sys.argv[1]
@@ -30,14 +35,62 @@ def main():
 			print(f"Deleted file: {letter_path}")
 		except Exception as e:
 			print(f"Could not delete file {letter_path}: {e}")
+	elif flag == "--submit-all":
+		letters_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else Path("LettersToSend")
+		letter_paths = sorted(letters_dir.glob("*.txt"))
+		if not letter_paths:
+			print(f"No letters found in {letters_dir}.")
+			sys.exit(0)
+		letter_ids = pypost.submit_letters(letter_paths)
+		print(f"{len(letter_ids)} letters submitted successfully!")
+		for letter_id, letter_path in zip(letter_ids, letter_paths):
+			print(f"  {letter_id}:{letter_path.name}")
+		# Delete the submitted letter files
+		for letter_path in letter_paths:
+			try:
+				letter_path.unlink(missing_ok=True)
+			except Exception as e:
+				print(f"Could not delete file {letter_path}: {e}")
+		print(f"Deleted {len(letter_paths)} files from {letters_dir}.")
 	elif flag == "--send_pending_letters":
-		sent_letters_ids = pypost.send_pending_letters()
+		parser = argparse.ArgumentParser(prog="python3 run_pypost.py --send_pending_letters")
+		mode = parser.add_mutually_exclusive_group()
+		mode.add_argument("--workers", type=int, default=1, metavar="N", help="deliver with N threads")
+		mode.add_argument("--batch", action="store_true", help="send each claimed batch with send_batch")
+		mode.add_argument("--prefetch", type=int, default=0, metavar="K", help="prepare the next K letters while sending")
+		options = parser.parse_args(sys.argv[2:])
+		start = time.perf_counter()
+		results = pypost.deliver_pending_letters(workers=options.workers, use_batch=options.batch,
+		                                         lookahead=options.prefetch)
+		wall_seconds = time.perf_counter() - start
+		sent_letters_ids = [f"{r.letter_id}: {r.letter_name}" for r in results if r.success]
+		failed = [r for r in results if not r.success]
 		if sent_letters_ids:
 			print(f"Letters sent successfully!: \n{', '.join(sent_letters_ids)}")
 		else:
 			print("No pending letters sent.")
+		for result in failed:
+			print(f"Failed: {result.letter_id}: {result.letter_name} ({result.error})")
+		if results:
+			print(pypost.timings.report(wall_seconds))
+	elif flag == "--refill-subjects":
+		target = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+		added = pypost.refill_subjects(target=target)
+		print(f"Added {added} subjects; {pypost.db.count_unused_subjects()} unused in the pool.")
+	elif flag == "--preview":
+		if len(sys.argv) not in (3, 4):
+			print("Usage: python3 run_pypost.py --preview letter_id [output.html]")
+			sys.exit(1)
+		letter_id = sys.argv[2]
+		html = pypost.preview_letter(letter_id)
+		if html is None:
+			print(f"Letter ID {letter_id} not found.")
+			sys.exit(1)
+		output_path = Path(sys.argv[3]) if len(sys.argv) == 4 else Path(f"{letter_id}.html")
+		output_path.write_text(html, encoding="utf-8")
+		print(f"Letter preview written to {output_path}")
 	else:
-		print("Unknown flag. Use --submit or --send_pending_letters.")
+		print("Unknown flag. Use --submit, --submit-all, --send_pending_letters, --refill-subjects or --preview.")
 
 if __name__ == "__main__":
 	main()
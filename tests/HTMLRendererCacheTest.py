@@ -0,0 +1,137 @@
+import sys
+import io
+import json
+import os
+import time
+import shutil
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from jinja2 import Template
+from modules.HTMLRenderer import HTMLRenderer, clear_template_cache
+from modules.letterHTMLRenderer import LetterHTMLRenderer
+from modules.emailBodyHTMLRenderer import EmailBodyHTMLRenderer
+
+letter_template_path = Path("../templates/letter_template.html")
+email_body_template_path = Path("../templates/email_body_template.html")
+cache_dir = Path(tempfile.mkdtemp())
+
+with open("test_data/mock_postal_info.json", "r", encoding="utf-8") as f:
+    postal_info = json.load(f)
+sender = postal_info["sender"]
+recipient = postal_info["recipient"]
+letter_context = {"letter_name": "2025-09-01", "letter_contents": "Querido Jesse,\n<b>hoy</b> pienso en ti 🐣"}
+for role, info in (("sender", sender), ("recipient", recipient)):
+    for key in ("name", "address_line1", "address_line2", "zip", "city_state", "country", "phone"):
+        letter_context[f"{role}_{key}"] = info.get(key, "")
+
+print("Test compiled templates are shared per path:")
+renderers = [HTMLRenderer(letter_template_path, cache_dir), HTMLRenderer(str(letter_template_path.resolve()), cache_dir)]
+if renderers[0].template is renderers[1].template \
+        and renderers[0].template is not HTMLRenderer(email_body_template_path, cache_dir).template:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest output matches a standalone Template (no autoescaping):")
+standalone = Template(letter_template_path.read_text(encoding="utf-8")).render(**letter_context)
+if renderers[0].render(letter_context) == standalone and "<b>hoy</b>" in standalone:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest bytecode cache is written and reused after a cache clear:")
+cached_files = list(cache_dir.glob("*.cache"))
+clear_template_cache()
+reloaded = HTMLRenderer(letter_template_path, cache_dir)
+if len(cached_files) == 2 and reloaded.template is not renderers[0].template \
+        and reloaded.render(letter_context) == standalone:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest LetterHTMLRenderer and EmailBodyHTMLRenderer are views over HTMLRenderer:")
+letter_html = LetterHTMLRenderer(str(letter_template_path), cache_dir).render(
+    letter_context["letter_contents"], sender, recipient, "2025-09-01")
+email_body_html = EmailBodyHTMLRenderer(str(email_body_template_path), cache_dir).render(
+    recipient["name"], "2025-09-01 10:00:00", "2025-09-01 10:00:00", "2025-09-03 08:00:00", "2025-09-03 08:00:05")
+expected_email_body = Template(email_body_template_path.read_text(encoding="utf-8")).render(
+    recipient_name=recipient["name"], created_date="2025-09-01 10:00:00", received_date="2025-09-01 10:00:00",
+    scheduled_delivery="2025-09-03 08:00:00", sent_date="2025-09-03 08:00:05")
+view_context = {key: value for key, value in letter_context.items() if key != "letter_name"}
+if letter_html == Template(letter_template_path.read_text(encoding="utf-8")).render(
+        letter_date="2025-09-01", **view_context) and email_body_html == expected_email_body:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest auto_reload picks up edits after the reload interval:")
+template_dir = Path(tempfile.mkdtemp())
+hot_template = template_dir / "hot_template.html"
+hot_template.write_text("<p>Hola {{ recipient_name }}</p>", encoding="utf-8")
+static_renderer = HTMLRenderer(hot_template, cache_dir)
+hot_renderer = HTMLRenderer(hot_template, cache_dir, auto_reload=True, reload_interval=0.2)
+context = {"recipient_name": "Jesse"}
+before = hot_renderer.render(context)
+
+def edit(text, bump_ns):
+    hot_template.write_text(text, encoding="utf-8")
+    mtime = hot_template.stat().st_mtime_ns + bump_ns  # coarse filesystem clocks: force a new mtime
+    os.utime(hot_template, ns=(mtime, mtime))
+
+edit("<p>Querido {{ recipient_name }}</p>", 1_000_000_000)
+throttled = hot_renderer.render(context)  # within the interval: no stat, old template
+time.sleep(0.25)
+after = hot_renderer.render(context)
+edit("<p>{{ recipient_name </p>", 2_000_000_000)  # syntax error: keep serving the last good template
+time.sleep(0.25)
+broken = hot_renderer.render(context)
+if before == throttled == "<p>Hola Jesse</p>" and after == broken == "<p>Querido Jesse</p>" \
+        and static_renderer.render(context) == "<p>Hola Jesse</p>":
+    print("PASS")
+else:
+    print("FAIL")
+shutil.rmtree(template_dir)
+
+print("\nTest iter_render and render_to stream the same HTML as render:")
+chunks = list(renderers[0].iter_render(letter_context))
+text_stream, binary_stream = io.StringIO(), io.BytesIO()
+renderers[0].render_to(text_stream, letter_context)
+renderers[0].render_to(binary_stream, letter_context, encoding="utf-8")
+if len(chunks) > 1 and "".join(chunks) == standalone and text_stream.getvalue() == standalone \
+        and binary_stream.getvalue().decode("utf-8") == standalone:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest render_many matches one render per context:")
+other_context = dict(letter_context, recipient_name="Skyler White", recipient_city_state="Albuquerque, NM")
+contexts = [dict(letter_context, letter_name=f"2025-09-0{i}", letter_contents=f"Carta {i}\n<i>{'hola ' * i}</i>")
+            for i in range(1, 6)]
+contexts += [dict(other_context, letter_name="2025-09-06"), dict(letter_context, letter_contents=""),
+             dict(letter_context, letter_contents=["not", "a", "string"])]
+if renderers[0].render_many(contexts) == [renderers[0].render(context) for context in contexts]:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest render_many falls back when the template transforms or branches on the spliced value:")
+filter_dir = Path(tempfile.mkdtemp())
+(filter_dir / "upper.html").write_text("<h1>{{ letter_name }}</h1>{{ letter_contents|upper }}", encoding="utf-8")
+(filter_dir / "replace.html").write_text("{{ recipient_name }}: {{ letter_contents|replace('o', '0') }}", encoding="utf-8")
+(filter_dir / "branch.html").write_text("{% if letter_contents|length > 10 %}<p>LONG</p>{% endif %}{{letter_contents}}",
+                                      encoding="utf-8")
+(filter_dir / "filtered.html").write_text("{% filter upper %}{{ letter_name }}: {{ letter_contents }}{% endfilter %}",
+                                        encoding="utf-8")
+filter_contexts = [{"recipient_name": "Jesse", "letter_name": f"carta-{i}", "letter_contents": "hola " * (5 - 2 * i)}
+                   for i in range(3)]
+if all(HTMLRenderer(filter_dir / name, cache_dir).render_many(filter_contexts)
+       == [HTMLRenderer(filter_dir / name, cache_dir).render(context) for context in filter_contexts]
+       for name in ("upper.html", "replace.html", "branch.html", "filtered.html")) \
+        and "LONG" not in HTMLRenderer(filter_dir / "branch.html", cache_dir).render_many(filter_contexts)[2]:
+    print("PASS")
+else:
+    print("FAIL")
+shutil.rmtree(filter_dir)
+
+shutil.rmtree(cache_dir)
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.blobCodec import BlobCodec, dictionary_from_template
+
+template_path = Path("../templates/letter_template.html")
+html = template_path.read_text(encoding="utf-8").replace("{{letter_contents}}", "Querida Jesse, " * 20)
+
+plain = BlobCodec(mode=None)
+zlib_codec = BlobCodec("zlib")
+zdict_codec = BlobCodec("zdict", zdict=dictionary_from_template(template_path))
+
+# Test plain mode stores text untouched
+print("Test plain mode:")
+if plain.encode(html) == html and plain.decode(html) == html:
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test zlib round trip and size reduction
+print("\nTest zlib round trip:")
+encoded = zlib_codec.encode(html)
+if isinstance(encoded, bytes) and len(encoded) < len(html.encode("utf-8")) and zlib_codec.decode(encoded) == html:
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test shared dictionary beats plain zlib on rendered letters
+print("\nTest zdict round trip:")
+dict_encoded = zdict_codec.encode(html)
+if zdict_codec.decode(dict_encoded) == html and len(dict_encoded) < len(encoded):
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test every codec decodes every format once the dictionary is registered
+print("\nTest cross-codec decoding:")
+reader = BlobCodec(mode=None)
+try:
+    reader.decode(dict_encoded)
+    unknown_dictionary_rejected = False
+except KeyError:
+    unknown_dictionary_rejected = True
+reader.register_dictionary(dictionary_from_template(template_path))
+if unknown_dictionary_rejected and reader.decode(encoded) == html and reader.decode(dict_encoded) == html:
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test short values that don't compress are kept as text
+print("\nTest incompressible values stay text:")
+if zlib_codec.encode("Hola") == "Hola" and zdict_codec.encode("Hola") == "Hola":
+    print("PASS")
+else:
+    print("FAIL")
@@ -0,0 +1,171 @@
+import sys
+import email
+import io
+import json
+import mailbox
+import shutil
+import smtplib
+import tempfile
+import threading
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules import smtpTransport
+from modules.deliveryTransport import (STREAM_CHUNK_SIZE, attachment_chunks, build_mime_message,
+                                       transport_from_config, write_mime_message)
+from modules.localMailSink import LocalMailSink
+from modules.rateLimiter import call_with_retry
+from modules.smtpTransport import SmtpTransport
+
+tmp_dir = Path(tempfile.mkdtemp())
+letter_attachment = ("2025-09-01.html", "<p>Querido Jesse 🐣</p>".encode("utf-8"), "application/octet-stream")
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP, recording connections and messages."""
+    connections = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.logins = 0
+        self.drop_next = False
+        FakeSMTP.connections.append(self)
+
+    def starttls(self, context=None):
+        pass
+
+    def login(self, username, password):
+        self.logins += 1
+
+    def send_message(self, message):
+        if self.drop_next:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(message)
+        return {}
+
+    def quit(self):
+        pass
+
+
+print("Test transport selection from config:")
+(tmp_dir / "maildir.json").write_text(json.dumps({"type": "maildir", "path": str(tmp_dir / "Maildir")}))
+(tmp_dir / "smtp.json").write_text(json.dumps({"type": "smtp", "host": "smtp.example.com", "username": "walter"}))
+maildir_sink = transport_from_config(tmp_dir / "maildir.json")
+smtp = transport_from_config(tmp_dir / "smtp.json")
+if isinstance(maildir_sink, LocalMailSink) and isinstance(smtp, SmtpTransport) and smtp.sender == "walter":
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest Maildir sink stores the letter:")
+maildir_sink.send_email("jesse@example.com", "Carta", "<p>Hola</p>", "html",
+                        bcc="walter@example.com", attachments=[letter_attachment])
+stored = list(mailbox.Maildir(tmp_dir / "Maildir"))
+attachment_parts = [part for part in stored[0].walk() if "attachment" in part.get("Content-Disposition", "")] if stored else []
+if len(stored) == 1 and stored[0]["to"] == "jesse@example.com" and stored[0]["subject"] == "Carta" \
+        and attachment_parts[0].get_payload(decode=True) == letter_attachment[1]:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest mbox sink via send_batch:")
+mbox_sink = LocalMailSink(str(tmp_dir / "letters.mbox"), mailbox_format="mbox")
+results = mbox_sink.send_batch([
+    {"to": f"jesse{i}@example.com", "subject": f"Carta {i}", "body": "Hola"} for i in range(3)
+] + [{"to": "broken@example.com", "subject": "Carta", "body": "Hola", "body_type": "markdown"}])
+mbox_sink.close()
+stored = list(mailbox.mbox(tmp_dir / "letters.mbox"))
+if [message["to"] for message in stored] == ["jesse0@example.com", "jesse1@example.com", "jesse2@example.com"] \
+        and all(result["error"] is None for result in results[:3]) and isinstance(results[3]["error"], ValueError):
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest mbox sinks sharing one file don't interleave writes:")
+shared_mbox = str(tmp_dir / "shared.mbox")
+def fill_mbox(writer):
+    sink = LocalMailSink(shared_mbox, mailbox_format="mbox")
+    for i in range(30):
+        sink.send_email(f"writer{writer}-{i}@example.com", "Carta", "Querido Jesse. " * 300)
+    sink.close()
+writers = [threading.Thread(target=fill_mbox, args=(writer,)) for writer in range(3)]
+for writer in writers:
+    writer.start()
+for writer in writers:
+    writer.join()
+stored = list(mailbox.mbox(shared_mbox))
+if len({message["to"] for message in stored}) == len(stored) == 90 \
+        and all(message.get_payload()[0].get_payload() == "Querido Jesse. " * 300 for message in stored):
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest SMTP connection is reused across sends:")
+smtpTransport.smtplib.SMTP = FakeSMTP
+for i in range(5):
+    smtp.send_email(f"jesse{i}@example.com", "Carta", "Hola", bcc="hardcoded@example.com")
+connection = FakeSMTP.connections[0]
+if len(FakeSMTP.connections) == 1 and connection.logins == 1 and len(connection.sent) == 5 \
+        and connection.sent[0]["from"] == "walter":
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest SMTP reconnects after a dropped connection:")
+connection.drop_next = True
+smtp.send_email("jesse@example.com", "Carta", "Hola")
+if len(FakeSMTP.connections) == 2 and len(FakeSMTP.connections[1].sent) == 1:
+    print("PASS")
+else:
+    print("FAIL")
+smtp.close()
+
+print("\nTest write_mime_message streams attachments:")
+long_letter = "<p>Querido Jesse 🐣</p>\n" * 20000
+chunks_read = []
+def letter_chunks():
+    for start in range(0, len(long_letter), 1000):
+        chunks_read.append(start)
+        yield long_letter[start:start + 1000]
+stream = io.BytesIO()
+write_mime_message(stream, "jesse@example.com", "Carta", "<p>Hola</p>", "html", bcc="walter@example.com",
+                   attachments=[("letter.html", letter_chunks(), "application/octet-stream"),
+                                ("note.txt", io.BytesIO(b"P.S."), "text/plain")])
+parsed = email.message_from_bytes(stream.getvalue())
+attachment_parts = [part for part in parsed.walk() if "attachment" in part.get("Content-Disposition", "")]
+in_memory = build_mime_message("jesse@example.com", "Carta", "<p>Hola</p>", "html",
+                               attachments=[("letter.html", long_letter.encode("utf-8"), "application/octet-stream")])
+if len(chunks_read) == -(-len(long_letter) // 1000) and parsed["bcc"] == "walter@example.com" and len(attachment_parts) == 2 \
+        and attachment_parts[0].get_payload(decode=True).decode("utf-8") == long_letter \
+        and attachment_parts[1].get_payload(decode=True) == b"P.S." \
+        and in_memory.get_payload()[1].get_payload(decode=True).decode("utf-8") == long_letter:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest a streamed attachment factory survives a retried send:")
+class FlakyMaildirSink(LocalMailSink):
+    """Consumes the attachments, then drops the first send like a broken connection."""
+    failures = 1
+
+    def send_email(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            write_mime_message(io.BytesIO(), *args, **kwargs)
+            raise ConnectionError("Connection reset by peer")
+        return super().send_email(*args, **kwargs)
+
+flaky = FlakyMaildirSink(str(tmp_dir / "FlakyMaildir"))
+call_with_retry(flaky.send_email, "jesse@example.com", "Carta", "<p>Hola</p>", "html", base_delay=0,
+                attachments=[("letter.html", lambda: iter([long_letter[:1000], long_letter[1000:]]),
+                              "application/octet-stream")])
+stored = list(mailbox.Maildir(tmp_dir / "FlakyMaildir"))
+chunks = list(attachment_chunks(long_letter))
+# A str is split every STREAM_CHUNK_SIZE characters, and UTF-8 takes at most 4 bytes a character.
+if len(stored) == 1 and stored[0].get_payload()[1].get_payload(decode=True).decode("utf-8") == long_letter \
+        and len(chunks) > 1 and all(len(chunk) <= 4 * STREAM_CHUNK_SIZE for chunk in chunks) \
+        and b"".join(chunks).decode("utf-8") == long_letter:
+    print("PASS")
+else:
+    print("FAIL")
+
+shutil.rmtree(tmp_dir)
@@ -0,0 +1,41 @@
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.emailSender import EmailSender, DiscoveryFileCache
+
+DISCOVERY_URL = "https://gmail.googleapis.com/$discovery/rest?version=v1"
+
+with tempfile.TemporaryDirectory() as cache_dir:
+    cache = DiscoveryFileCache(cache_dir, ttl=60)
+
+    # Test a miss, then a hit after set
+    print("Test cache miss and hit:")
+    miss = cache.get(DISCOVERY_URL)
+    cache.set(DISCOVERY_URL, '{"name": "gmail"}')
+    if miss is None and cache.get(DISCOVERY_URL) == '{"name": "gmail"}':
+        print("PASS")
+    else:
+        print("FAIL")
+
+    # Test entries older than the TTL are ignored
+    print("\nTest expired entries:")
+    old = time.time() - 120
+    os.utime(cache._path(DISCOVERY_URL), (old, old))
+    if cache.get(DISCOVERY_URL) is None:
+        print("PASS")
+    else:
+        print("FAIL")
+
+# Test the service (and its OAuth flow) is only built on first use
+print("\nTest lazy service construction:")
+built = []
+emailSender = EmailSender("missing_client_secret.json", "missing_tokens", "gmail", "v1", "https://mail.google.com/")
+emailSender.create_service = lambda *args: built.append(args) or "service"
+constructed_lazily = not built
+if constructed_lazily and emailSender.service == "service" and emailSender.service == "service" and len(built) == 1:
+    print("PASS")
+else:
+    print("FAIL")
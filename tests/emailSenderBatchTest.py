@@ -0,0 +1,130 @@
+import sys
+import base64
+import email
+from pathlib import Path
+import httplib2
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMock, HttpMockSequence
+from modules.emailSender import EmailSender
+
+# Runs offline: the Gmail client is built from the bundled discovery document
+# and batch requests are answered by a local stand-in HTTP transport.
+BATCH_BOUNDARY = "batch_pypost_test"
+BATCH_RESPONSE = f"""--{BATCH_BOUNDARY}
+Content-Type: application/http
+Content-Transfer-Encoding: binary
+Content-ID: <response-pypost+0>
+
+HTTP/1.1 200 OK
+Content-Type: application/json
+
+{{"id": "msg-0", "labelIds": ["SENT"]}}
+
+--{BATCH_BOUNDARY}
+Content-Type: application/http
+Content-Transfer-Encoding: binary
+Content-ID: <response-pypost+1>
+
+HTTP/1.1 429 Too Many Requests
+Content-Type: application/json
+
+{{"error": {{"code": 429, "message": "Rate Limit Exceeded"}}}}
+
+--{BATCH_BOUNDARY}
+Content-Type: application/http
+Content-Transfer-Encoding: binary
+Content-ID: <response-pypost+2>
+
+HTTP/1.1 200 OK
+Content-Type: application/json
+
+{{"id": "msg-2", "labelIds": ["SENT"]}}
+
+--{BATCH_BOUNDARY}--"""
+
+service = build("gmail", "v1", http=HttpMock(), static_discovery=True)
+emailSender = EmailSender(None, None, "gmail", "v1", service=service)
+
+messages = [
+    {"to": f"jesse{i}@example.com", "subject": f"Carta {i}", "body": "<p>Hola</p>", "body_type": "html",
+     "attachment_paths": ["test_data/mock_attach_2.html"]}
+    for i in range(3)
+]
+messages.append({"to": "broken@example.com", "subject": "Carta", "body": "Hola", "body_type": "markdown"})
+
+transport = HttpMockSequence([
+    ({"status": "200", "content-type": f'multipart/mixed; boundary="{BATCH_BOUNDARY}"'}, BATCH_RESPONSE),
+])
+results = emailSender.send_batch(messages, http=transport)
+
+print("Test send_batch per-message results:")
+if results[0]["response"]["id"] == "msg-0" and results[0]["error"] is None \
+        and results[1]["response"] is None and results[1]["error"].resp.status == 429 \
+        and results[2]["response"]["id"] == "msg-2" \
+        and isinstance(results[3]["error"], ValueError):
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest send_batch splits large lists into batch-limit round trips:")
+responses = []
+for start in (0, 2):
+    parts = [
+        f"--{BATCH_BOUNDARY}\nContent-Type: application/http\nContent-ID: <response-pypost+{i}>\n\n"
+        f"HTTP/1.1 200 OK\nContent-Type: application/json\n\n{{\"id\": \"msg-{i}\"}}\n\n"
+        for i in range(start, start + 2)
+    ]
+    responses.append(({"status": "200", "content-type": f'multipart/mixed; boundary="{BATCH_BOUNDARY}"'},
+                      "".join(parts) + f"--{BATCH_BOUNDARY}--"))
+transport = HttpMockSequence(responses)
+results = emailSender.send_batch(messages[:3] + messages[:1], batch_size=2, http=transport)
+if [result["response"]["id"] for result in results] == ["msg-0", "msg-1", "msg-2", "msg-3"]:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest in-memory attachments:")
+raw_message = emailSender.build_raw_message(
+    "jesse@example.com", "Carta", "<p>Hola</p>", "html",
+    attachments=[("2025-09-01.html", "<p>Querido Jesse 🐣</p>".encode("utf-8"), "application/octet-stream")]
+)
+parsed = email.message_from_bytes(base64.urlsafe_b64decode(raw_message))
+attachment_parts = [part for part in parsed.walk() if "attachment" in part.get("Content-Disposition", "")]
+if len(attachment_parts) == 1 and "2025-09-01.html" in attachment_parts[0]["Content-Disposition"] \
+        and attachment_parts[0].get_payload(decode=True).decode("utf-8") == "<p>Querido Jesse 🐣</p>":
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest streamed attachments are uploaded as message/rfc822 media:")
+class RecordingHttp:
+    """Answers a resumable upload: session start, then one chunk."""
+    def __init__(self):
+        self.requests = []
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        self.requests.append({"uri": uri, "method": method, "body": body, "headers": headers or {}})
+        if len(self.requests) == 1:
+            return httplib2.Response({"status": "200", "location": "https://upload.example.com/session"}), b""
+        return httplib2.Response({"status": "200"}), b'{"id": "msg-streamed", "labelIds": ["SENT"]}'
+
+recording_http = RecordingHttp()
+streaming_sender = EmailSender(None, None, "gmail", "v1",
+                               service=build("gmail", "v1", http=recording_http, static_discovery=True))
+long_letter = "<p>Querido Jesse 🐣</p>\n" * 5000
+response = streaming_sender.send_email(
+    "jesse@example.com", "Carta", "<p>Hola</p>", "html",
+    attachments=[("2025-09-01.html", (long_letter[i:i + 4096] for i in range(0, len(long_letter), 4096)),
+                  "application/octet-stream")]
+)
+start, upload = recording_http.requests
+uploaded = email.message_from_bytes(upload["body"])
+attachment_parts = [part for part in uploaded.walk() if "attachment" in part.get("Content-Disposition", "")]
+if response["id"] == "msg-streamed" and "uploadType=resumable" in start["uri"] \
+        and start["headers"].get("X-Upload-Content-Type") == "message/rfc822" \
+        and upload["uri"] == "https://upload.example.com/session" and uploaded["to"] == "jesse@example.com" \
+        and attachment_parts[0].get_payload(decode=True).decode("utf-8") == long_letter:
+    print("PASS")
+else:
+    print("FAIL")
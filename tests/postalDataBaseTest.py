@@ -1,10 +1,13 @@
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from modules.postalDatabase import PostalDatabase
+from modules.postalDatabase import PostalDatabase, MIGRATIONS, to_epoch
+from modules.blobCodec import BlobCodec
 from datetime import datetime, timedelta
 import sqlite3
+import threading
 import uuid
+import time
 import json
 import os
 
@@ -27,6 +30,7 @@ mock_letters = [
         "letter_name": "2025-09-01",
         "creation_datetime": dtstr(0, 10),
         "contents": "First letter.",
+        "html_contents": "<p>First letter.</p>",
         "postal_info": postal_info,
         "received_date": dtstr(0, 10),
         "scheduled_delivery_datetime": dtstr(1, 8),
@@ -38,6 +42,7 @@ mock_letters = [
         "letter_name": "2025-09-02",
         "creation_datetime": dtstr(1, 11),
         "contents": "Second letter.",
+        "html_contents": "<p>Second letter.</p>",
         "postal_info": postal_info,
         "received_date": dtstr(1, 11),
         "scheduled_delivery_datetime": dtstr(2, 8),
@@ -49,6 +54,7 @@ mock_letters = [
         "letter_name": "2025-09-03",
         "creation_datetime": dtstr(2, 12),
         "contents": "Third letter.",
+        "html_contents": "<p>Third letter.</p>",
         "postal_info": postal_info,
         "received_date": dtstr(2, 12),
         "scheduled_delivery_datetime": dtstr(3, 8),
@@ -77,6 +83,18 @@ if isinstance(pending, list) and len(pending) == 2:
 else:
     print("FAIL")
 
+# Test get_pending_letter_records loads the body lazily
+print("\nTest get_pending_letter_records:")
+records = db.get_pending_letter_records()
+lazy_before_access = all(not record.body_loaded for record in records)
+contents = {record["letter_name"]: record["contents"] for record in records}
+if len(records) == 2 and lazy_before_access and all(record.body_loaded for record in records) \
+        and contents["2025-09-01"] == "First letter." \
+        and records[0]["postal_info"] == postal_info:
+    print("PASS")
+else:
+    print("FAIL")
+
 # Test get_last_submitted_letter
 print("\nTest get_last_submitted_letter:")
 last = db.get_last_submitted_letter()
@@ -111,16 +129,284 @@ if updated and updated["status"] == "delivered" and updated["delivery_datetime"]
 else:
     print("FAIL")
 
+# Test streaming iterators walk keyset pages across chunk boundaries
+print("\nTest iter_all_letters / iter_all_delivered_letters / iter_all_letters_summary:")
+streamed = [letter["letter_id"] for letter in db.iter_all_letters(chunk_size=2)]
+streamed_delivered = [letter["letter_id"] for letter in db.iter_all_delivered_letters(chunk_size=1)]
+streamed_summary = [letter["letter_id"] for letter in db.iter_all_letters_summary(chunk_size=1)]
+expected_delivered = [letter["letter_id"] for letter in db.get_all_delivered_letters()]
+if streamed == sorted(letter["letter_id"] for letter in mock_letters) \
+        and streamed_summary == streamed \
+        and streamed_delivered == expected_delivered and len(streamed_delivered) == 2:
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test insert_letters is a single all-or-nothing transaction
+print("\nTest insert_letters:")
+batch = [dict(mock_letters[0], letter_id=str(uuid.uuid4()), letter_name=f"batch-{i}") for i in range(3)]
+inserted_ids = db.insert_letters(batch)
+try:
+    db.insert_letters([dict(batch[0], letter_id=str(uuid.uuid4())), batch[1]])  # batch[1] is a duplicate
+    rolled_back = False
+except sqlite3.IntegrityError:
+    rolled_back = len(db.getAllLetters()) == len(mock_letters) + len(batch)
+if inserted_ids == [letter["letter_id"] for letter in batch] \
+        and all(db.get_letter_by_id(letter_id) for letter_id in inserted_ids) and rolled_back:
+    print("PASS")
+else:
+    print("FAIL")
+for letter_id in inserted_ids:
+    db.delete_letter_by_id(letter_id)
+
+# Test postal_info is stored once in parties and decoded once per party
+print("\nTest deduplicated parties:")
+party_count = db.conn.execute("SELECT COUNT(*) FROM parties").fetchone()[0]
+all_letters = db.getAllLetters()
+other_postal_info = dict(postal_info, recipient=dict(postal_info["recipient"], name="Skyler White"))
+other_letter = dict(mock_letters[0], letter_id=str(uuid.uuid4()), postal_info=other_postal_info)
+db.insert_letter(other_letter)
+if party_count == 1 and all(letter["postal_info"] is all_letters[0]["postal_info"] for letter in all_letters) \
+        and db.get_letter_by_id(other_letter["letter_id"])["postal_info"] == other_postal_info \
+        and db.conn.execute("SELECT COUNT(*) FROM parties").fetchone()[0] == 2:
+    print("PASS")
+else:
+    print("FAIL")
+db.delete_letter_by_id(other_letter["letter_id"])
+
+# Test epoch columns are populated on insert
+print("\nTest epoch timestamp columns:")
+second = db.get_letter_by_id(mock_letters[1]["letter_id"])
+if second["received_ts"] == to_epoch(second["received_date"]) \
+        and second["scheduled_delivery_ts"] == to_epoch(second["scheduled_delivery_datetime"]) \
+        and updated["delivery_ts"] == to_epoch(delivery_dt):
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test migrating a pre-migration (user_version 0) database
+print("\nTest schema migration from legacy database:")
+legacy_path = "test_data/legacyPostalDatabase.db"
+with sqlite3.connect(legacy_path) as conn:
+    conn.execute("""
+        CREATE TABLE letters (
+            letter_id TEXT PRIMARY KEY, letter_name TEXT NOT NULL, creation_datetime TEXT NOT NULL,
+            contents TEXT NOT NULL, html_contents TEXT NOT NULL, postal_info TEXT NOT NULL,
+            received_date TEXT NOT NULL, scheduled_delivery_datetime TEXT NOT NULL,
+            delivery_datetime TEXT, status TEXT NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO letters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+        "legacy-1", "2025-08-01", dtstr(-31), "Legacy letter.", "<p>Legacy letter.</p>",
+        json.dumps(postal_info), dtstr(-31), dtstr(-30), dtstr(-30, 9), "delivered"
+    ))
+conn.close()
+legacy_db = PostalDatabase(legacy_path)
+legacy = legacy_db.get_letter_by_id("legacy-1")
+if legacy_db.schema_version() == len(MIGRATIONS) \
+        and legacy["received_ts"] == to_epoch(dtstr(-31)) \
+        and legacy["scheduled_delivery_ts"] == to_epoch(dtstr(-30)) \
+        and legacy["delivery_ts"] == to_epoch(dtstr(-30, 9)) \
+        and legacy["postal_info"] == postal_info:
+    print("PASS")
+else:
+    print("FAIL")
+legacy_db.close()
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(legacy_path + suffix):
+        os.remove(legacy_path + suffix)
+
+# Test senders opening a legacy database at the same time migrate it once
+print("\nTest concurrent migration of a legacy database:")
+with sqlite3.connect(legacy_path) as conn:
+    conn.execute("""
+        CREATE TABLE letters (
+            letter_id TEXT PRIMARY KEY, letter_name TEXT NOT NULL, creation_datetime TEXT NOT NULL,
+            contents TEXT NOT NULL, html_contents TEXT NOT NULL, postal_info TEXT NOT NULL,
+            received_date TEXT NOT NULL, scheduled_delivery_datetime TEXT NOT NULL,
+            delivery_datetime TEXT, status TEXT NOT NULL
+        )
+    """)
+conn.close()
+opened, errors = [], []
+start = threading.Barrier(8)
+def open_legacy():
+    start.wait()
+    try:
+        opened.append(PostalDatabase(legacy_path))
+    except Exception as e:
+        errors.append(e)
+threads = [threading.Thread(target=open_legacy) for _ in range(8)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+if not errors and len(opened) == 8 and all(opened_db.schema_version() == len(MIGRATIONS) for opened_db in opened):
+    print("PASS")
+else:
+    print(f"FAIL {errors[:1]}")
+for opened_db in opened:
+    opened_db.close()
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(legacy_path + suffix):
+        os.remove(legacy_path + suffix)
+
+# Test claims from concurrent senders never overlap, and expired leases are reaped
+print("\nTest claim_due_letters / release_letter / reap_expired_leases:")
+lease_path = "test_data/leasePostalDatabase.db"
+senders = [PostalDatabase(lease_path) for _ in range(2)]
+due_letters = [dict(mock_letters[0], letter_id=str(uuid.uuid4()), letter_name=f"due-{i}") for i in range(10)]
+senders[0].insert_letters(due_letters)
+claims = [senders[0].claim_due_letters("sender-a", limit=4), senders[1].claim_due_letters("sender-b", limit=4)]
+claims.append(senders[1].claim_due_letters("sender-c", limit=4, lease_seconds=-1))
+claimed_ids = [letter["letter_id"] for claim in claims for letter in claim]
+released = senders[0].release_letter(claims[0][0]["letter_id"], "sender-b")  # wrong owner: no-op
+reaped = senders[0].reap_expired_leases()
+still_sending = senders[0].conn.execute("SELECT COUNT(*) FROM letters WHERE status = 'sending'").fetchone()[0]
+if [len(claim) for claim in claims] == [4, 4, 2] and len(set(claimed_ids)) == 10 \
+        and not released and reaped == 2 and still_sending == 8 \
+        and senders[0].release_letter(claims[0][0]["letter_id"], "sender-a"):
+    print("PASS")
+else:
+    print("FAIL")
+for sender in senders:
+    sender.close()
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(lease_path + suffix):
+        os.remove(lease_path + suffix)
+
+# Test failed deliveries are recorded and back off
+print("\nTest record_delivery_failure and retry backoff:")
+retry_path = "test_data/retryPostalDatabase.db"
+retry_db = PostalDatabase(retry_path)
+retry_letters = [dict(mock_letters[0], letter_id=str(uuid.uuid4()), letter_name=f"retry-{i}") for i in range(3)]
+retry_db.insert_letters(retry_letters)
+claimed = retry_db.claim_due_letters("sender-a", limit=3)
+attempts = [retry_db.record_delivery_failure(claimed[0]["letter_id"], "HttpError 429", retry_after=600),
+            retry_db.record_delivery_failure(claimed[0]["letter_id"], "HttpError 503", retry_after=600)]
+retry_db.record_delivery_failure(claimed[1]["letter_id"], "timeout", retry_after=-1)  # backoff already over
+retry_db.update_letter_status(claimed[2]["letter_id"], "delivered", delivery_datetime=dtstr())
+failed = retry_db.get_letter_by_id(claimed[0]["letter_id"])
+pending_ids = {letter["letter_id"] for letter in retry_db.get_pending_letters()}
+reclaimed = retry_db.claim_due_letters("sender-b", limit=3)
+if attempts == [1, 2] and failed["status"] == "in transit" and failed["last_error"] == "HttpError 503" \
+        and failed["lease_owner"] is None and pending_ids == {claimed[1]["letter_id"]} \
+        and [letter["letter_id"] for letter in reclaimed] == [claimed[1]["letter_id"]] \
+        and retry_db.record_delivery_failure(claimed[2]["letter_id"], "late", retry_after=60) is None:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest retry_cutoff and giving up on a letter:")
+retry_id = claimed[1]["letter_id"]
+retry_db.record_delivery_failure(retry_id, "timeout", retry_after=-1)
+before_run = retry_db.claim_due_letters("sender-c", limit=3, retry_cutoff=int(time.time()) - 60)
+after_run = retry_db.claim_due_letters("sender-c", limit=3)
+final_attempts = retry_db.record_delivery_failure(retry_id, "HttpError 400", retry_after=None)
+given_up = retry_db.get_letter_by_id(retry_id)
+if before_run == [] and [letter["letter_id"] for letter in after_run] == [retry_id] and final_attempts == 3 \
+        and given_up["status"] == "failed" and given_up["next_retry_ts"] is None \
+        and given_up["lease_owner"] is None and retry_db.claim_due_letters("sender-d", limit=3) == [] \
+        and retry_db.record_delivery_failure(retry_id, "again", retry_after=60) is None:
+    print("PASS")
+else:
+    print("FAIL")
+retry_db.close()
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(retry_path + suffix):
+        os.remove(retry_path + suffix)
+
+# Test the subject pool hands out each subject at most once
+print("\nTest subject pool:")
+first_added = db.add_subjects(["💌 Una carta para ti", "📬 Llegó tu carta", "💌 Una carta para ti"])
+first_taken = [db.take_subject(), db.take_subject(), db.take_subject()]
+readded = db.add_subjects(["📬 Llegó tu carta", "✉️ Correo del corazón"])  # used subject is not re-added
+if first_added == 2 and first_taken == ["💌 Una carta para ti", "📬 Llegó tu carta", None] \
+        and readded == 1 and db.count_unused_subjects() == 1 and db.take_subject() == "✉️ Correo del corazón":
+    print("PASS")
+else:
+    print("FAIL")
+
+# Test full-text search stays in sync with inserts, deletes and compressed contents
+print("\nTest search:")
+search_letter = dict(mock_letters[0], letter_id=str(uuid.uuid4()), letter_name="2025-09-09",
+                     contents="Te escribo desde Albuquerque con muchísimo cariño. " * 10)
+with PostalDatabase("test_data/searchPostalDatabase.db", codec=BlobCodec("zlib")) as search_db:
+    search_db.insert_letter(search_letter)
+    hits = search_db.search("muchisimo cariño")
+    missing = search_db.search("Heisenberg")
+    search_db.delete_letter_by_id(search_letter["letter_id"])
+    after_delete = search_db.search("cariño")
+if len(hits) == 1 and hits[0]["letter_id"] == search_letter["letter_id"] and "[cariño]" in hits[0]["snippet"] \
+        and not missing and not after_delete:
+    print("PASS")
+else:
+    print("FAIL")
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists("test_data/searchPostalDatabase.db" + suffix):
+        os.remove("test_data/searchPostalDatabase.db" + suffix)
+
+# Test compressed storage and migrating existing rows with recompress_letters
+print("\nTest compressed storage and recompress_letters:")
+compressed_path = "test_data/compressedPostalDatabase.db"
+long_letter = dict(mock_letters[0], contents="Querida Jesse. " * 50, html_contents="<p>" + "Querida Jesse. " * 50 + "</p>")
+with PostalDatabase(compressed_path) as plain_db:
+    plain_db.insert_letter(long_letter)
+with PostalDatabase(compressed_path, codec=BlobCodec("zlib")) as zlib_db:
+    rewritten = zlib_db.recompress_letters()
+    rewritten_again = zlib_db.recompress_letters()
+    stored = zlib_db.conn.execute("SELECT contents, html_contents FROM letters").fetchone()
+    compressed_letter = zlib_db.get_letter_by_id(long_letter["letter_id"])
+with PostalDatabase(compressed_path) as plain_reader:
+    reread = plain_reader.get_letter_record(long_letter["letter_id"])
+    reread_html = reread["html_contents"]
+if rewritten == 1 and rewritten_again == 0 and all(isinstance(value, bytes) for value in stored) \
+        and compressed_letter["contents"] == long_letter["contents"] \
+        and reread_html == long_letter["html_contents"]:
+    print("PASS")
+else:
+    print("FAIL")
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(compressed_path + suffix):
+        os.remove(compressed_path + suffix)
+
+# Test that the status/schedule queries are served by an index
+print("\nTest query plans use indexes:")
+statements = []
+db.conn.set_trace_callback(statements.append)
+indexed_queries = {
+    "get_pending_letters": db.get_pending_letters,
+    "get_last_submitted_letter": db.get_last_submitted_letter,
+    "get_next_letter_to_deliver": db.get_next_letter_to_deliver,
+    "get_all_delivered_letters": db.get_all_delivered_letters,
+    "get_next_letters_2deliver_summary": db.get_next_letters_2deliver_summary,
+    "get_delivered_letters_page": lambda: db.get_delivered_letters_page(after=(dtstr(0), ""), limit=10),
+}
+for name, query in indexed_queries.items():
+    statements.clear()
+    query()
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+    plan = [row[3] for sql in selects for row in db.conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    if selects and all("USING" in step and "INDEX" in step for step in plan if step.startswith(("SCAN", "SEARCH"))) \
+            and not any(step == "SCAN letters" for step in plan):
+        print(f"PASS {name}")
+    else:
+        print(f"FAIL {name}: {plan}")
+db.conn.set_trace_callback(None)
+
 # Clean up: Delete all letters from the database
-with sqlite3.connect(db.db_path) as conn:
-    c = conn.cursor()
+with db.conn:
+    c = db.conn.cursor()
     c.execute("DELETE FROM letters")
-    conn.commit()
     print("\nCleanup: All letters deleted.")
+db.close()
 
 # Delete the database file itself
 if os.path.exists(db.db_path):
     os.remove(db.db_path)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db.db_path + suffix):
+            os.remove(db.db_path + suffix)
     print("Database file deleted.")
 else:
     print("Database file not found for deletion.")
\ No newline at end of file
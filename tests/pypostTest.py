@@ -0,0 +1,171 @@
+import sys
+import mailbox
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from benchmarks.fakeServices import FakeAiTextGenerator, FakeServiceError
+from modules.localMailSink import LocalMailSink
+from modules.pypost import PyPost
+
+tmp_dir = Path(tempfile.mkdtemp())
+letter_count = 24
+
+
+class FlakyMaildirSink(LocalMailSink):
+    """Maildir sink that drops the letters named in `transient` and rejects those in `permanent`."""
+
+    def __init__(self, path, transient=(), permanent=()):
+        super().__init__(path)
+        self.transient = set(transient)
+        self.permanent = set(permanent)
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+
+    def send_email(self, to, subject, body, body_type='plain', attachment_paths=None, bcc=None, attachments=None):
+        letter_name = attachments[0][0].removesuffix(".html")
+        with self._calls_lock:
+            self.calls[letter_name] += 1
+        if letter_name in self.transient:
+            raise ConnectionError("Connection reset by peer")
+        if letter_name in self.permanent:
+            raise FakeServiceError(400, "Invalid To header")
+        return super().send_email(to, subject, body, body_type, attachment_paths, bcc, attachments)
+
+
+def make_pypost(name, **options) -> PyPost:
+    """A PyPost over a fresh database holding `letter_count` letters, all due now."""
+    case_dir = tmp_dir / name
+    letters_dir = case_dir / "letters"
+    letters_dir.mkdir(parents=True)
+    paths = []
+    for i in range(letter_count):
+        path = letters_dir / f"{name}-{i:02d}.txt"
+        path.write_text(f"Querido Jesse, carta {i} 🐣", encoding="utf-8")
+        paths.append(path)
+    pypost = PyPost(db_path=str(case_dir / "postal.db"), postal_info_path="test_data/mock_postal_info.json",
+                    template_cache_dir=case_dir / "template_cache", render_cache_dir=case_dir / "render_cache",
+                    send_rate=None, ai_rate=None, **options)
+    pypost.ai_text_generator = FakeAiTextGenerator()
+    pypost.submit_letters(paths)
+    with pypost.db.conn:
+        pypost.db.conn.execute("UPDATE letters SET scheduled_delivery_ts = 0")
+    return pypost
+
+
+def delivered_names(maildir_path) -> Counter:
+    names = Counter()
+    for message in mailbox.Maildir(maildir_path):
+        for part in message.walk():
+            if "attachment" in part.get("Content-Disposition", ""):
+                names[part.get_filename().strip().removesuffix(".html")] += 1
+    return names
+
+
+print("Test every letter is delivered exactly once in each delivery mode:")
+modes = {"serial": {}, "workers": {"workers": 4}, "batch": {"use_batch": True}, "prefetch": {"lookahead": 3}}
+for mode, mode_options in modes.items():
+    pypost = make_pypost(mode)
+    pypost.email_sender = LocalMailSink(str(tmp_dir / mode / "Maildir"))
+    results = pypost.deliver_pending_letters(claim_size=5, **mode_options)
+    again = pypost.deliver_pending_letters(claim_size=5, **mode_options)
+    names = delivered_names(tmp_dir / mode / "Maildir")
+    expected = {f"{mode}-{i:02d}" for i in range(letter_count)}
+    statuses = {letter["status"] for letter in pypost.db.get_all_letters_summary()}
+    if len(results) == letter_count and all(result.success for result in results) \
+            and {result.letter_name for result in results} == expected and again == [] \
+            and set(names) == expected and set(names.values()) == {1} and statuses == {"delivered"}:
+        print("PASS")
+    else:
+        print(f"FAIL ({mode})")
+    pypost.db.close()
+
+print("\nTest failed letters are recorded, released and never sent twice:")
+for mode, mode_options in modes.items():
+    name = f"failing-{mode}"
+    transient = {f"{name}-{i:02d}" for i in (0, 7, 13)}
+    permanent = {f"{name}-{i:02d}" for i in (3, 20)}
+    # A zero backoff makes failed letters due again mid-run; the run must still not retry them.
+    pypost = make_pypost(name, send_attempts=1, retry_base_delay=0, retry_max_delay=0)
+    sink = pypost.email_sender = FlakyMaildirSink(str(tmp_dir / name / "Maildir"), transient, permanent)
+    results = pypost.deliver_pending_letters(claim_size=2, **mode_options)
+    failed = {result.letter_name for result in results if not result.success}
+    letters = {letter["letter_name"]: pypost.db.get_letter_by_id(letter["letter_id"])
+               for letter in pypost.db.get_all_letters_summary()}
+    first_run_ok = len(results) == letter_count and failed == transient | permanent \
+        and set(sink.calls.values()) == {1} \
+        and all(letters[n]["status"] == "in transit" and letters[n]["attempt_count"] == 1
+                and letters[n]["lease_owner"] is None and "ConnectionError" in letters[n]["last_error"]
+                for n in transient) \
+        and all(letters[n]["status"] == "failed" and letters[n]["next_retry_ts"] is None for n in permanent)
+
+    time.sleep(1.1)  # the zero backoff has now passed
+    sink.transient.clear()
+    retried = pypost.deliver_pending_letters(claim_size=2, **mode_options)
+    names = delivered_names(tmp_dir / name / "Maildir")
+    if first_run_ok and {result.letter_name for result in retried} == transient \
+            and all(result.success for result in retried) \
+            and set(names) == {f"{name}-{i:02d}" for i in range(letter_count)} - permanent \
+            and set(names.values()) == {1} and all(sink.calls[n] == 1 for n in permanent):
+        print("PASS")
+    else:
+        print(f"FAIL ({mode})")
+    pypost.db.close()
+
+print("\nTest a database error after a send doesn't turn delivered letters into failures:")
+for mode, mode_options in {"serial": {}, "batch": {"use_batch": True}}.items():
+    name = f"unmarked-{mode}"
+    pypost = make_pypost(name, send_attempts=1)
+    with pypost.db.conn:  # only the first three letters are due
+        pypost.db.conn.execute("UPDATE letters SET scheduled_delivery_ts = ? WHERE letter_name > ?",
+                               (int(time.time()) + 3600, f"{name}-02"))
+    transient = {f"{name}-01"}
+    pypost.email_sender = FlakyMaildirSink(str(tmp_dir / name / "Maildir"), transient)
+    update_letter_status = pypost.db.update_letter_status
+    marks = []
+    def failing_second_mark(*args, **kwargs):
+        marks.append(args[0])
+        if len(marks) == 2:
+            raise sqlite3.OperationalError("database is locked")
+        return update_letter_status(*args, **kwargs)
+    pypost.db.update_letter_status = failing_second_mark
+    results = pypost.deliver_letters_batch(pypost.db.claim_due_letters("test", limit=3)) if mode_options \
+        else [pypost.deliver_letter(letter) for letter in pypost.db.claim_due_letters("test", limit=3)]
+    letters = {letter["letter_name"]: pypost.db.get_letter_by_id(letter["letter_id"])
+               for letter in pypost.db.get_all_letters_summary()}
+    sent = {f"{name}-00", f"{name}-02"}
+    if {result.letter_name: result.success for result in results} == {**dict.fromkeys(sent, True), f"{name}-01": False} \
+            and letters[f"{name}-01"]["attempt_count"] == 1 and letters[f"{name}-01"]["status"] == "in transit" \
+            and sorted(letters[n]["status"] for n in sent) == ["delivered", "sending"] \
+            and all(letters[n]["attempt_count"] == 0 and letters[n]["last_error"] is None for n in sent):
+        print("PASS")
+    else:
+        print(f"FAIL ({mode})")
+    pypost.db.close()
+
+print("\nTest a failing AI API costs a send run one bounded refill request:")
+class TimingOutAiTextGenerator:
+    def __init__(self):
+        self.timeouts = []
+
+    def generate(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        raise TimeoutError("Request timed out")
+
+pypost = make_pypost("no-ai", subject_timeout=0.5)
+pypost.email_sender = LocalMailSink(str(tmp_dir / "no-ai" / "Maildir"))
+pypost.ai_text_generator = TimingOutAiTextGenerator()
+results = pypost.deliver_pending_letters(claim_size=5)
+# One pool request, then one single-subject try per letter, all with the subject timeout.
+if len(results) == letter_count and all(result.success for result in results) \
+        and pypost.ai_text_generator.timeouts == [0.5] * (1 + letter_count):
+    print("PASS")
+else:
+    print("FAIL")
+pypost.db.close()
+
+shutil.rmtree(tmp_dir)
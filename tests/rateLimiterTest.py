@@ -0,0 +1,80 @@
+import sys
+import random
+import smtplib
+import threading
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.rateLimiter import TokenBucket, backoff_delay, call_with_retry, is_retryable
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient.errors.HttpError: the status lives on .resp."""
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.resp = type("Response", (), {"status": status})()
+
+
+class RateLimitError(Exception):
+    """Shaped like openai.RateLimitError."""
+    status_code = 429
+
+
+print("Test token bucket limits the rate across threads:")
+bucket = TokenBucket(rate=50, capacity=5)
+start = time.monotonic()
+threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+elapsed = time.monotonic() - start
+# 20 tokens with a burst of 5 at 50/s: the last 15 take about 0.3 s.
+if 0.25 <= elapsed < 0.6:
+    print("PASS")
+else:
+    print(f"FAIL: {elapsed:.3f}s")
+
+print("\nTest jittered backoff bounds:")
+rng = random.Random(7)
+delays = [[backoff_delay(attempt, base=60, cap=3600, rng=rng) for _ in range(100)] for attempt in (1, 3, 10)]
+if 30 <= min(delays[0]) and max(delays[0]) <= 60 \
+        and 120 <= min(delays[1]) and max(delays[1]) <= 240 \
+        and 1800 <= min(delays[2]) and max(delays[2]) <= 3600 \
+        and len(set(delays[0])) > 90:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest retryable error classification:")
+retryable = [FakeHttpError(429), FakeHttpError(503), FakeHttpError(403, "userRateLimitExceeded"),
+             RateLimitError(), TimeoutError(), smtplib.SMTPServerDisconnected(),
+             smtplib.SMTPResponseException(421, b"Try again later")]
+permanent = [FakeHttpError(400), FakeHttpError(403, "insufficientPermissions"), ValueError("bad body_type"),
+             smtplib.SMTPResponseException(550, b"No such user")]
+if all(is_retryable(e) for e in retryable) and not any(is_retryable(e) for e in permanent):
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest call_with_retry retries only retryable errors:")
+calls = []
+def flaky(to):
+    calls.append(to)
+    if len(calls) < 3:
+        raise FakeHttpError(429)
+    return {"id": "msg-0", "to": to}
+result = call_with_retry(flaky, to="jesse@example.com", attempts=3, base_delay=0.01)
+permanent_calls = []
+def broken():
+    permanent_calls.append(1)
+    raise FakeHttpError(400)
+try:
+    call_with_retry(broken, attempts=3, base_delay=0.01)
+    raised = False
+except FakeHttpError:
+    raised = True
+if result["id"] == "msg-0" and len(calls) == 3 and raised and len(permanent_calls) == 1:
+    print("PASS")
+else:
+    print("FAIL")
@@ -0,0 +1,164 @@
+import sys
+import os
+import mailbox
+import shutil
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.renderCache import RenderCache, content_hash, render_key
+from modules.localMailSink import LocalMailSink
+from modules.pypost import PyPost
+
+tmp_dir = Path(tempfile.mkdtemp())
+
+print("Test in-memory LRU eviction:")
+cache = RenderCache(max_entries=2)
+cache.put("a", "<p>A</p>")
+cache.put("b", "<p>B</p>")
+cache.get("a")
+cache.put("c", "<p>C</p>")
+if cache.get("a") == "<p>A</p>" and cache.get("b") is None and cache.get("c") == "<p>C</p>" \
+        and cache.hits == 3 and cache.misses == 1:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest renderings persist on disk across instances:")
+renders = []
+def render():
+    renders.append(1)
+    return "<p>Querido Jesse 🐣</p>"
+key = render_key("template", content_hash("2025-09-01", "Querido Jesse"), "postal_info")
+first = RenderCache(tmp_dir / "render_cache").get_or_render(key, render)
+second_cache = RenderCache(tmp_dir / "render_cache")
+second = second_cache.get_or_render(key, render)
+if first == second == "<p>Querido Jesse 🐣</p>" and len(renders) == 1 and second_cache.disk_hits == 1 \
+        and not list((tmp_dir / "render_cache").glob("*/*.tmp")):
+    print("PASS")
+else:
+    print("FAIL")
+second_cache.clear()
+if second_cache.get(key) is None and not list((tmp_dir / "render_cache").glob("*/*.html")):
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest the disk tier is pruned least recently used first:")
+pruned_dir = tmp_dir / "pruned_cache"
+pruned = RenderCache(pruned_dir, max_entries=1, max_disk_bytes=10**6)
+for i in range(10):
+    pruned.put(f"key{i}", "x" * 1000)
+    os.utime(pruned._path(f"key{i}"), (1000 + i, 1000 + i))
+RenderCache(pruned_dir).get("key0")  # a disk hit makes key0 the most recently used
+removed = pruned.prune(5000)
+kept = sorted(path.stem for path in pruned_dir.glob("*/*.html"))
+capped = RenderCache(tmp_dir / "capped_cache", max_disk_bytes=5000)
+for i in range(30):
+    capped.put(f"key{i}", "x" * 1000)
+capped_bytes = sum(path.stat().st_size for path in (tmp_dir / "capped_cache").glob("*/*.html"))
+if removed == 5 and kept == ["key0", "key6", "key7", "key8", "key9"] and 0 < capped_bytes <= 5000 \
+        and capped.get("key29") == "x" * 1000:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest keys change with every input:")
+keys = {
+    render_key("t1", content_hash("2025-09-01", "Hola"), "p1"),
+    render_key("t2", content_hash("2025-09-01", "Hola"), "p1"),
+    render_key("t1", content_hash("2025-09-02", "Hola"), "p1"),
+    render_key("t1", content_hash("2025-09-01", "Adiós"), "p1"),
+    render_key("t1", content_hash("2025-09-01", "Hola"), "p2"),
+}
+if len(keys) == 5:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest deferred letters render at send time like eager ones:")
+template_path = tmp_dir / "letter_template.html"
+shutil.copy("../templates/letter_template.html", template_path)
+letter_path = tmp_dir / "2025-09-01.txt"
+letter_path.write_text("Querido Jesse,\nhoy pienso en ti 🐣", encoding="utf-8")
+options = dict(letter_template_path=template_path, postal_info_path="test_data/mock_postal_info.json",
+               render_cache_dir=tmp_dir / "letters_cache", template_cache_dir=tmp_dir / "template_cache",
+               template_auto_reload=True, template_reload_interval=0)
+eager = PyPost(db_path=str(tmp_dir / "eager.db"), **options)
+deferred = PyPost(db_path=str(tmp_dir / "deferred.db"), defer_rendering=True, **options)
+eager_id = eager.submit_letter(letter_path)
+deferred_ids = deferred.submit_letters([letter_path])
+stored = deferred.db.get_letter_by_id(deferred_ids[0])
+eager_html = eager.preview_letter(eager_id)
+deferred_html = deferred.preview_letter(deferred_ids[0])
+if stored["html_contents"] == "" and stored["template_hash"] == deferred.letter_renderer.source_hash \
+        and eager.db.get_letter_by_id(eager_id)["template_hash"] is None \
+        and deferred_html == eager_html and "hoy pienso en ti 🐣" in deferred_html \
+        and deferred.preview_letter("missing") is None:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest only a long uncached deferred letter is streamed into the attachment:")
+deferred.db.add_subjects(["Una carta para ti", "Otra carta", "Y una más", "Otra más"])
+eager.db.add_subjects(["Una carta para ti"])
+deferred.stream_min_size = 10000
+second_path = tmp_dir / "2025-09-02.txt"
+second_path.write_text("Querido Jesse,\n" + "te extraño 🐣\n" * 5000, encoding="utf-8")
+second = deferred.db.get_letter_record(deferred.submit_letter(second_path))
+stored_data = eager.prepare_email(eager.db.get_letter_record(eager_id))["attachments"][0][1]
+short_data = deferred.prepare_email(deferred.db.get_letter_record(deferred_ids[0]))["attachments"][0][1]
+filename, factory, _ = deferred.prepare_email(second)["attachments"][0]
+postal_info = second["postal_info"]
+expected = deferred.render_letter_template(second["contents"], postal_info["sender"], postal_info["recipient"],
+                                           second["letter_name"])
+partial = factory()
+next(partial)
+partial.close()  # an interrupted send caches nothing
+uncached = deferred.render_cache.get(deferred._render_key(second)) is None
+first_chunks = list(factory())
+if stored_data == eager_html and short_data == deferred_html \
+        and filename == "2025-09-02.html" and callable(factory) and len(first_chunks) > 1 and uncached \
+        and deferred.prepare_email(second)["attachments"][0][1] == expected \
+        and "".join(first_chunks) == "".join(factory()) == expected \
+        and deferred.render_cache.get(deferred._render_key(second)) == expected:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest a resend after a send renders the deferred letter once:")
+renders = []
+renderer = deferred.letter_renderer
+render, iter_render = renderer.render, renderer.iter_render
+renderer.render = lambda context: (renders.append(1), render(context))[1]
+renderer.iter_render = lambda context: (renders.append(1), iter_render(context))[1]
+deferred.email_sender = LocalMailSink(str(tmp_dir / "Maildir"))
+deferred.db.add_subjects(["Una carta más", "Y otra"])
+third_path = tmp_dir / "2025-09-03.txt"
+third_path.write_text("Querido Jesse,\nmañana te escribo otra vez 🐣", encoding="utf-8")
+third = deferred.db.get_letter_record(deferred.submit_letter(third_path))
+results = [deferred.deliver_letter(third), deferred.deliver_letter(third)]
+attachments = {part.get_payload(decode=True) for message in mailbox.Maildir(tmp_dir / "Maildir")
+               for part in message.walk() if "attachment" in part.get("Content-Disposition", "")}
+if all(result.success for result in results) and len(renders) == 1 and len(attachments) == 1 \
+        and "mañana te escribo otra vez 🐣" in attachments.pop().decode("utf-8"):
+    print("PASS")
+else:
+    print("FAIL")
+renderer.render, renderer.iter_render = render, iter_render
+
+print("\nTest a resend is a cache hit and a template edit is picked up:")
+deferred.prepare_email(deferred.db.get_letter_record(deferred_ids[0]))
+hits = deferred.render_cache.hits
+template_path.write_text(template_path.read_text(encoding="utf-8").replace("</body>", "<p>P.D.</p></body>"),
+                         encoding="utf-8")
+os.utime(template_path, ns=(0, 10**18))  # make sure the mtime changes
+edited_html = deferred.preview_letter(deferred_ids[0])
+if hits >= 1 and edited_html != deferred_html and "<p>P.D.</p>" in edited_html \
+        and eager.preview_letter(eager_id) == eager_html:
+    print("PASS")
+else:
+    print("FAIL")
+
+eager.db.close()
+deferred.db.close()
+shutil.rmtree(tmp_dir)
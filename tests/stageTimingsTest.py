@@ -0,0 +1,38 @@
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from modules.stageTimings import StageTimings, percentile
+
+print("Test percentile (nearest rank):")
+samples = sorted(float(i) for i in range(1, 101))
+if percentile(samples, 0.50) == 50.0 and percentile(samples, 0.99) == 99.0 \
+        and percentile([7.0], 0.99) == 7.0 and percentile([], 0.5) == 0.0:
+    print("PASS")
+else:
+    print("FAIL")
+
+print("\nTest stage summary and report:")
+timings = StageTimings()
+for seconds in (0.010, 0.020, 0.030):
+    timings.record("send", seconds)
+with timings.measure("render"):
+    time.sleep(0.01)
+try:
+    with timings.measure("subject"):
+        raise TimeoutError("AI request timed out")
+except TimeoutError:
+    pass
+summary = timings.summary()
+report = timings.report(wall_seconds=0.05)
+if summary["send"]["count"] == 3 and abs(summary["send"]["total_s"] - 0.06) < 1e-9 \
+        and abs(summary["send"]["p50_ms"] - 20.0) < 1e-6 and summary["render"]["total_s"] >= 0.01 \
+        and summary["subject"]["count"] == 1 and "overlapped" in report:
+    print("PASS")
+else:
+    print("FAIL")
+timings.reset()
+if timings.summary() == {}:
+    print("PASS")
+else:
+    print("FAIL")